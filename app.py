@@ -4,22 +4,59 @@ A Flask web interface for the text-based RPG
 """
 
 import os
+import copy
 import random
 import json
 from datetime import datetime
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import click
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from markupsafe import Markup
 from werkzeug.security import generate_password_hash, check_password_hash
-import local_database as db
-from local_database import ensure_data_dir
+from werkzeug.http import is_resource_modified
+from itsdangerous import BadSignature, Signer
+import storage
+import session_store
+import export
+import visit_writer
+import metrics
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-key-for-testing")
 
+# Keep session data on the server; the cookie only carries a signed session id
+session_store.init_app(
+    app,
+    backend=os.environ.get("SESSION_BACKEND", "sqlite"),
+    ttl=int(os.environ.get("SESSION_TTL", session_store.DEFAULT_TTL))
+)
+
 # Setup database
-ensure_data_dir()
+db = storage.get_backend()
+db.ensure_data_dir()
+
+# Node visits are written in batches by a background thread, unless
+# VISIT_WRITER=sync asks for the old write-per-request behaviour
+visits = None
+if os.environ.get("VISIT_WRITER", "async") != "sync":
+    visits = visit_writer.VisitWriter(
+        db,
+        max_queue=int(os.environ.get("VISIT_QUEUE_SIZE", 10000)),
+        batch_size=int(os.environ.get("VISIT_BATCH_SIZE", 256)),
+        flush_interval=float(os.environ.get("VISIT_FLUSH_INTERVAL", 0.5))
+    )
+
+# Prometheus metrics on /metrics when METRICS_ENABLED is set
+metrics.init_app(app, db)
+if visits is not None:
+    metrics.register_collector(lambda: [
+        (f"visit_writer_{name}" if name in ("queued", "max_queue") else f"visit_writer_{name}_total",
+         "gauge" if name in ("queued", "max_queue") else "counter",
+         f"Background visit writer: {name}", [({}, value)])
+        for name, value in visits.stats().items()
+    ])
 
 # Setup Flask-Login
 login_manager = LoginManager()
@@ -52,6 +89,35 @@ def create_admin_command():
     """Comando para criar usuário admin"""
     create_admin_user()
 
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(['characters', 'node-visits']))
+@click.option('--format', 'fmt', type=click.Choice(export.FORMATS), default='csv', show_default=True)
+@click.option('--since', help='Visitas a partir desta data (YYYY-MM-DD)')
+@click.option('--until', help='Visitas até esta data, inclusive (YYYY-MM-DD)')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Arquivo de saída (padrão: stdout)')
+def export_command(dataset, fmt, since, until, output):
+    """Exporta personagens ou visitas em CSV ou JSONL"""
+    try:
+        start = export.parse_date(since)
+        end = export.parse_date(until, end=True)
+    except ValueError:
+        raise click.BadParameter('Use o formato YYYY-MM-DD')
+    if dataset == 'characters':
+        chunks = export.export_characters(db, fmt)
+    else:
+        chunks = export.export_node_visits(db, fmt, start, end)
+    for chunk in chunks:
+        output.write(chunk)
+
+@app.cli.command('compact-visits')
+@click.option('--days', type=int, default=None, help='Dias de visitas brutas a manter (padrão: VISIT_RETENTION_DAYS)')
+def compact_visits_command(days):
+    """Agrega visitas antigas em resumos diários e por personagem"""
+    if days is None:
+        days = int(os.environ.get('VISIT_RETENTION_DAYS', db.VISIT_RETENTION_DAYS))
+    rolled = db.compact_node_visits(days)
+    click.echo(f"{rolled} visitas agregadas; visitas dos últimos {days} dias mantidas.")
+
 # Em versões mais recentes do Flask, before_first_request foi removido
 # Vamos usar uma função que será chamada na primeira requisição
 try:
@@ -119,15 +185,96 @@ def admin_info():
 # Import the game modules so we can use them in our routes
 import player
 import battle
+import battle_engine
+import battle_log
 import save_load
+import autosave
 import node_map
 import game_data
+import fragment_cache
+
+# Rendered story panels, keyed by node id and node version
+node_fragments = fragment_cache.FragmentCache(int(os.environ.get("NODE_FRAGMENT_CACHE_SIZE", fragment_cache.DEFAULT_SIZE)))
+
+# Progress is autosaved in the background after story transitions,
+# unless AUTOSAVE=off
+autosaves = None
+if os.environ.get("AUTOSAVE", "on") != "off":
+    autosaves = autosave.AutosaveScheduler(
+        debounce=float(os.environ.get("AUTOSAVE_DEBOUNCE", 5)),
+        min_interval=float(os.environ.get("AUTOSAVE_MIN_INTERVAL", 30)),
+        max_dirty_age=float(os.environ.get("AUTOSAVE_MAX_DIRTY_AGE", 60))
+    )
+    metrics.register_collector(lambda: [
+        (f"autosave_{name}" if name == "pending" else f"autosave_{name}_total",
+         "gauge" if name == "pending" else "counter",
+         f"Autosave scheduler: {name}", [({}, value)])
+        for name, value in autosaves.stats().items()
+    ])
+
+# Number of messages kept in a battle's log
+app.config['BATTLE_LOG_LENGTH'] = int(os.environ.get("BATTLE_LOG_LENGTH", battle_log.DEFAULT_CAPACITY))
+
+@app.before_request
+def refresh_story_nodes():
+    """Pick up story node edits saved by other workers"""
+    node_map.refresh()
+
+# The save owner id also lives in its own long-lived signed cookie, so a
+# player keeps reaching their saves after the session expires
+PLAYER_COOKIE = 'player_id'
+PLAYER_COOKIE_MAX_AGE = int(os.environ.get("PLAYER_COOKIE_MAX_AGE", 2 * 365 * 24 * 3600))
+player_id_signer = Signer(app.secret_key, salt='player-id')
+
+def known_player_id():
+    """Id of the player owning this browser's saves, or None if it has none yet"""
+    player_id = session.get('player_id')
+    if not player_id and PLAYER_COOKIE in request.cookies:
+        try:
+            player_id = player_id_signer.unsign(request.cookies[PLAYER_COOKIE]).decode()
+        except BadSignature:
+            return None
+        if not save_load.PLAYER_ID_PATTERN.match(player_id):
+            return None
+        session['player_id'] = player_id
+    return player_id
+
+def get_player_id():
+    """Id of the player owning this browser's saves, created on first use"""
+    player_id = known_player_id()
+    if not player_id:
+        player_id = session['player_id'] = save_load.new_player_id()
+    return player_id
+
+@app.after_request
+def remember_player_id(response):
+    """(Re)issue the player id cookie whenever the session has an id the cookie lacks"""
+    player_id = session.get('player_id')
+    if player_id:
+        signed = player_id_signer.sign(player_id).decode()
+        if request.cookies.get(PLAYER_COOKIE) != signed:
+            response.set_cookie(
+                PLAYER_COOKIE, signed,
+                max_age=PLAYER_COOKIE_MAX_AGE,
+                httponly=True,
+                secure=app.config['SESSION_COOKIE_SECURE'],
+                samesite='Lax'
+            )
+    return response
+
+def mark_autosave():
+    """Schedule an autosave of the session's game after a story transition"""
+    if autosaves is not None and 'player' in session:
+        autosaves.mark_dirty(get_player_id(), session['player'], session['current_node'],
+                             session.get('turn_counter', 0))
 
 @app.route('/play')
 def play_game():
     """Play the RPG game page"""
     try:
-        return render_template('play.html')
+        player_id = known_player_id()
+        saves = save_load.list_saves(player_id) if player_id else []
+        return render_template('play.html', saves=saves)
     except Exception as e:
         print(f"Erro na página de jogo: {e}")
         # Falhar de maneira resiliente, tentar renderizar uma versão simplificada
@@ -146,18 +293,7 @@ def create_character():
             new_player = player.Player(name, character_class, gender)
 
             # Store in session
-            session['player'] = {
-                'name': new_player.name,
-                'class': new_player.character_class,
-                'gender': new_player.gender,
-                'mental': new_player.mental,
-                'physical': new_player.physical,
-                'spiritual': new_player.spiritual,
-                'max_health': new_player.max_health,
-                'current_health': new_player.current_health,
-                'inventory': new_player.inventory,
-                'special_abilities': new_player.special_abilities
-            }
+            session['player'] = new_player.to_dict()
             session['current_node'] = 'start'
             session['turn_counter'] = 0
 
@@ -174,9 +310,17 @@ def game():
 
     # Get current node
     current_node_id = session.get('current_node', 'start')
-    node_data = node_map.get_node(current_node_id)
 
-    return render_template('game.html', node=node_data, node_id=current_node_id, player=session['player'])
+    # The story panel is the same for every player at this node, so the
+    # node's text is only read when its panel is not cached yet
+    node_block = node_fragments.get_or_render(
+        current_node_id,
+        node_map.node_version(current_node_id),
+        lambda: Markup(render_template('_node_block.html', node=node_map.get_node(current_node_id), node_id=current_node_id))
+    )
+
+    return render_template('game.html', node_id=current_node_id, node_block=node_block, player=session['player'],
+                           save_slots=save_load.SAVE_SLOTS)
 
 @app.route('/make_choice', methods=['POST'])
 def make_choice():
@@ -236,6 +380,8 @@ def make_choice():
         else:
             session['current_node'] = choice['next_node']
 
+        mark_autosave()
+
     return redirect(url_for('game'))
 
 @app.route('/continue', methods=['POST'])
@@ -249,6 +395,7 @@ def continue_story():
 
     if 'next_node' in node:
         session['current_node'] = node['next_node']
+        mark_autosave()
 
     return redirect(url_for('game'))
 
@@ -292,11 +439,17 @@ def save_game():
     # Get current turn counter
     turn_counter = session.get('turn_counter', 0)
 
+    slot = request.values.get('slot', save_load.DEFAULT_SLOT)
+    if slot not in save_load.SAVE_SLOTS:
+        flash('Espaço de salvamento inválido.', 'danger')
+        return redirect(url_for('game'))
+
     # Save game using the save_load module
-    success = save_load.save_game(session['player'], session['current_node'], turn_counter)
+    success = save_load.save_game(session['player'], session['current_node'], turn_counter,
+                                  get_player_id(), slot)
 
     if success:
-        flash('Jogo salvo com sucesso!', 'success')
+        flash(f'Jogo salvo no espaço {slot}!', 'success')
     else:
         flash('Erro ao salvar o jogo.', 'danger')
 
@@ -304,14 +457,20 @@ def save_game():
 
 @app.route('/load_game')
 def load_game():
-    """Load a saved game"""
+    """Load a saved game, by default the most recent one"""
+    player_id = known_player_id()
+    slot = request.args.get('slot')
+    if slot is None and player_id:
+        saves = save_load.list_saves(player_id)
+        slot = saves[0]['slot'] if saves else None
+
     # Check if save exists
-    if not save_load.save_exists():
+    if not slot or not save_load.save_exists(player_id, slot):
         flash('Nenhum jogo salvo encontrado.', 'warning')
         return redirect(url_for('play_game'))
 
     # Load game
-    loaded_game = save_load.load_game()
+    loaded_game = save_load.load_game(player_id, slot)
     if loaded_game:
         # Store in session
         session['player'] = loaded_game['player']
@@ -350,179 +509,166 @@ def battle_start():
         'spirit_resistance': enemy_data.get('spirit_resistance', 10)
     }
 
-    session['battle_log'] = [f"Você encontrou um {enemy_data['name']}!"]
+    log = battle_log.BattleLog(app.config['BATTLE_LOG_LENGTH'])
+    log.append(f"Você encontrou um {enemy_data['name']}!")
+    session['battle_log'] = log.to_dict()
 
     return render_template('battle.html', 
                           player=session['player'],
                           enemy=session['enemy'],
-                          battle_log=session['battle_log'])
+                          battle_log=log.newest_first(),
+                          battle_log_seq=log.last_seq)
 
-@app.route('/battle_action', methods=['POST'])
-def battle_action():
-    """Process a battle action"""
-    if 'player' not in session or 'enemy' not in session:
-        return redirect(url_for('game'))
+def play_battle_turn(action):
+    """
+    Play one battle round for the session's player and enemy
 
-    action = request.form.get('action')
+    Returns:
+        dict: roll, message, success, result, died, the log entries added this
+              turn and the fields of player and enemy that changed, or None
+              if action is not one of battle_engine.ACTIONS
+    """
+    if action not in battle_engine.ACTIONS:
+        return None
 
     # Get player and enemy data
-    player_data = session['player']
+    # The engine works on a copy, so the session's dict stays as it was before the round
+    player_before = session['player']
+    player_data = copy.deepcopy(player_before)
     enemy_data = session['enemy']
+    enemy_before = dict(enemy_data)
 
-    # Initialize battle variables
-    dice_roll = random.randint(1, 20)
-    battle_message = ""
-    battle_success = False
-    player_damage_taken = 0
-    enemy_damage_taken = 0
-
-    # Process player action
-    if action == 'attack':
-        # Physical attack
-        attack_total = dice_roll + player_data['physical']
-
-        if dice_roll == 20:  # Critical hit
-            enemy_damage_taken = (player_data['physical'] * 2) + random.randint(3, 6)
-            battle_message = f"Acerto crítico! Você causou {enemy_damage_taken} pontos de dano!"
-            battle_success = True
-        elif dice_roll == 1:  # Critical miss
-            enemy_damage_taken = 0
-            battle_message = "Erro crítico! Você tropeça e erra o ataque!"
-            battle_success = False
-        elif attack_total >= enemy_data['defense'] + 5:  # Strong hit
-            enemy_damage_taken = player_data['physical'] + random.randint(2, 5)
-            battle_message = f"Ótimo golpe! Você causou {enemy_damage_taken} pontos de dano!"
-            battle_success = True
-        elif attack_total >= enemy_data['defense']:  # Normal hit
-            enemy_damage_taken = max(1, player_data['physical'] + random.randint(0, 3) - enemy_data['defense'] // 2)
-            battle_message = f"Você acerta o golpe e causa {enemy_damage_taken} pontos de dano."
-            battle_success = True
-        else:  # Miss
-            enemy_damage_taken = 0
-            battle_message = "Seu ataque foi bloqueado ou desviado."
-            battle_success = False
-
-    elif action == 'defend':
-        # Defensive stance
-        session['defending'] = True
-        battle_message = "Você assume uma postura defensiva!"
-        battle_success = True
-
-    elif action == 'spirit':
-        # Spiritual attack/action
-        spirit_total = dice_roll + player_data['spiritual']
-
-        if dice_roll == 20:  # Critical success
-            if random.random() < 0.5:  # 50% chance for damage
-                enemy_damage_taken = player_data['spiritual'] * 2 + random.randint(2, 8)
-                battle_message = f"Os Òrìṣà atendem seu chamado com poder imenso! Você causa {enemy_damage_taken} pontos de dano espiritual!"
-                battle_success = True
-            else:  # 50% chance for healing
-                heal_amount = player_data['spiritual'] + random.randint(3, 8)
-                player_data['current_health'] = min(player_data['current_health'] + heal_amount, player_data['max_health'])
-                battle_message = f"Os Òrìṣà renovam sua força vital! Você recupera {heal_amount} pontos de vida!"
-                battle_success = True
-        elif dice_roll == 1:  # Critical failure
-            backfire = random.randint(1, 4)
-            player_data['current_health'] -= backfire
-            battle_message = f"A energia espiritual se descontrola! Você sofre {backfire} pontos de dano!"
-            battle_success = False
-        elif spirit_total >= enemy_data['spirit_resistance'] + 5:  # Strong spiritual effect
-            enemy_damage_taken = player_data['spiritual'] + random.randint(2, 5)
-            battle_message = f"A energia espiritual afeta profundamente o inimigo! Você causa {enemy_damage_taken} pontos de dano espiritual!"
-            battle_success = True
-        elif spirit_total >= enemy_data['spirit_resistance']:  # Normal spiritual effect
-            enemy_damage_taken = max(1, player_data['spiritual'] - enemy_data['spirit_resistance'] // 3)
-            heal_amount = random.randint(1, 3)
-            player_data['current_health'] = min(player_data['current_health'] + heal_amount, player_data['max_health'])
-            battle_message = f"Você canaliza energia espiritual e causa {enemy_damage_taken} pontos de dano! Também recupera {heal_amount} pontos de vida."
-            battle_success = True
-        else:  # Failure
-            battle_message = "Você tenta canalizar energia espiritual, mas falha."
-            battle_success = False
-
-    # Apply damage to enemy
-    enemy_data['current_health'] -= enemy_damage_taken
+    # Resolve the round with the shared battle engine
+    outcome = battle_engine.play_round(player_data, enemy_data, action)
+    player_event = outcome['events'][0]
+    battle_message = battle_engine.describe(player_event)
+    reward_message = None
+    died = False
 
     # Log the action
-    session['battle_log'].insert(0, battle_message)
-
-    # If enemy still alive, process enemy attack
-    if enemy_data['current_health'] > 0:
-        # Enemy attacks
-        enemy_message = f"O {enemy_data['name']} ataca!"
-        session['battle_log'].insert(0, enemy_message)
-
-        # Calculate damage
-        base_damage = enemy_data['attack']
-        if session.get('defending', False):
-            player_damage_taken = max(1, base_damage - player_data['physical'] - random.randint(2, 5))
-            enemy_message = f"Sua defesa reduziu o dano! Você recebe {player_damage_taken} pontos de dano."
-        else:
-            player_damage_taken = max(1, base_damage - random.randint(0, 2))
-            enemy_message = f"Você recebe {player_damage_taken} pontos de dano!"
+    log = load_battle_log()
+    first_seq = log.last_seq
+    log.append(battle_message)
+
+    # If the enemy survived, it attacked back
+    if len(outcome['events']) > 1:
+        log.append(f"O {enemy_data['name']} ataca!")
 
-        # Apply damage to player
-        player_data['current_health'] -= player_damage_taken
-        
         # Check if player died
         if player_data['current_health'] <= 0:
-            session['battle_log'].insert(0, "Você perdeu todos os pontos de vida e morreu!")
-            return redirect(url_for('game', node_id='04_001'))  # Redireciona para nó de morte
-
-        # Log the enemy action
-        session['battle_log'].insert(0, enemy_message)
-
-        # Reset defending status
-        session['defending'] = False
+            log.append("Você perdeu todos os pontos de vida e morreu!")
+            died = True
+        else:
+            # Log the enemy action
+            log.append(battle_engine.describe(outcome['events'][1]))
+
+    if not died:
+        # Check if battle is over
+        if outcome['result'] == 'victory':
+            # Player won
+            enemy_rewards = battle.get_enemy_data(enemy_data.get('id')).get('rewards', {})
+            session['battle_rewards'] = enemy_rewards
+            reward_event = battle_engine.apply_rewards(player_data, enemy_rewards)
+            reward_message = battle_engine.describe(reward_event)
+            log.append("Vitória! " + reward_message)
+
+        elif outcome['result'] == 'defeat':
+            # Player lost
+            log.append(f"Você foi derrotado pelo {enemy_data['name']}!")
 
     # Update session data
     session['player'] = player_data
     session['enemy'] = enemy_data
+    session['battle_log'] = log.to_dict()
+
+    return {
+        'roll': outcome['roll'],
+        'message': battle_message,
+        'success': battle_engine.is_success(player_event),
+        'reward': reward_message,
+        'result': outcome['result'],
+        'died': died,
+        'log': log,
+        'entries': log.since(first_seq),
+        'player_changes': {key: value for key, value in player_data.items() if player_before.get(key) != value},
+        'enemy_changes': {key: value for key, value in enemy_data.items() if enemy_before.get(key) != value},
+        'player_health_delta': player_data['current_health'] - player_before['current_health'],
+        'enemy_health_delta': enemy_data['current_health'] - enemy_before['current_health']
+    }
 
-    # Check if battle is over
-    if enemy_data['current_health'] <= 0:
-        # Player won
-        enemy_rewards = battle.get_enemy_data(enemy_data['id']).get('rewards', {})
-        session['battle_rewards'] = enemy_rewards
-
-        # Process rewards
-        reward_message = "Você ganhou: "
-
-        if 'attribute' in enemy_rewards:
-            attr_type = enemy_rewards['attribute']['type']
-            attr_amount = enemy_rewards['attribute']['amount']
-            player_data[attr_type] += attr_amount
-            reward_message += f"+{attr_amount} {attr_type}, "
-
-        if 'item' in enemy_rewards:
-            item = enemy_rewards['item']
-            if 'inventory' not in player_data:
-                player_data['inventory'] = []
-            player_data['inventory'].append(item)
-            reward_message += f"{item}, "
-
-        if 'health' in enemy_rewards:
-            health_amount = enemy_rewards['health']
-            player_data['current_health'] = min(player_data['current_health'] + health_amount, player_data['max_health'])
-            reward_message += f"+{health_amount} de vida, "
-
-        # Update session
-        session['player'] = player_data
-        session['battle_log'].insert(0, "Vitória! " + reward_message[:-2])
-
-    elif player_data['current_health'] <= 0:
-        # Player lost
-        session['battle_log'].insert(0, f"Você foi derrotado pelo {enemy_data['name']}!")
+@app.route('/battle_action', methods=['POST'])
+def battle_action():
+    """Process a battle action"""
+    if 'player' not in session or 'enemy' not in session:
+        return redirect(url_for('game'))
+
+    turn = play_battle_turn(request.form.get('action'))
+    if turn is None:
+        log = load_battle_log()
+        return render_template('battle.html',
+                               player=session['player'],
+                               enemy=session['enemy'],
+                               battle_log=log.newest_first(),
+                               battle_log_seq=log.last_seq,
+                               battle_message='Ação inválida.',
+                               battle_success=False), 400
+    if turn['died']:
+        return redirect(url_for('game', node_id='04_001'))  # Redireciona para nó de morte
 
     # Render the battle template with updated data
     return render_template('battle.html', 
                           player=session['player'],
                           enemy=session['enemy'],
-                          battle_log=session['battle_log'],
-                          dice_roll=dice_roll,
-                          battle_message=battle_message,
-                          battle_success=battle_success)
+                          battle_log=turn['log'].newest_first(),
+                          battle_log_seq=turn['log'].last_seq,
+                          dice_roll=turn['roll'],
+                          battle_message=turn['message'],
+                          battle_success=turn['success'],
+                          reward=turn['reward'])
+
+@app.route('/api/battle/action', methods=['POST'])
+def api_battle_action():
+    """Process a battle action and return only what changed, as JSON"""
+    if 'player' not in session or 'enemy' not in session:
+        return jsonify({'error': 'Nenhuma batalha em andamento', 'redirect': url_for('game')}), 409
+
+    action = request.form.get('action') or (request.get_json(silent=True) or {}).get('action')
+    turn = play_battle_turn(action)
+    if turn is None:
+        return jsonify({'error': 'Ação inválida'}), 400
+    response = {
+        'roll': turn['roll'],
+        'message': turn['message'],
+        'success': turn['success'],
+        'result': turn['result'],
+        'reward': turn['reward'],
+        'player': turn['player_changes'],
+        'enemy': turn['enemy_changes'],
+        'player_health_delta': turn['player_health_delta'],
+        'enemy_health_delta': turn['enemy_health_delta'],
+        'log': [{'seq': seq, 'message': message} for seq, message in turn['entries']],
+        'last_seq': turn['log'].last_seq
+    }
+    if turn['died']:
+        response['redirect'] = url_for('game', node_id='04_001')
+    return jsonify(response)
+
+def load_battle_log():
+    """Load the current battle's log from the session"""
+    return battle_log.BattleLog.from_dict(session.get('battle_log'), app.config['BATTLE_LOG_LENGTH'])
+
+@app.route('/battle_log')
+def battle_log_delta():
+    """Return the battle log entries newer than the client's last sequence number"""
+    if 'battle_log' not in session:
+        return jsonify({'entries': [], 'last_seq': 0})
+
+    since = request.args.get('since', 0, type=int)
+    log = load_battle_log()
+    return jsonify({
+        'entries': [{'seq': seq, 'message': message} for seq, message in log.since(since)],
+        'last_seq': log.last_seq
+    })
 
 @app.route('/battle_end', methods=['POST'])
 def battle_end():
@@ -544,6 +690,8 @@ def battle_end():
         if key in session:
             session.pop(key)
 
+    mark_autosave()
+
     return redirect(url_for('game'))
 
 # ==============================================================================
@@ -567,6 +715,8 @@ def admin_login():
         admin = db.get_admin_by_username(username)
         
         if admin and check_password_hash(admin.password_hash, password):
+            # New session id on privilege change, so a planted id cannot ride the login
+            session_store.regenerate(session)
             login_user(admin)
             if db.update_admin_login(admin.username):
                 flash('Login realizado com sucesso!', 'success')
@@ -582,6 +732,7 @@ def admin_login():
 def admin_logout():
     """Admin logout"""
     logout_user()
+    session_store.regenerate(session)
     flash('Você saiu do sistema.', 'info')
     return redirect(url_for('admin_login'))
 
@@ -614,23 +765,57 @@ def admin_dashboard():
         recent_characters=recent_characters
     )
 
+def story_response(scope, build):
+    """
+    Serve a response that only depends on the saved story, with validators
+
+    The ETag combines the story version with the logged-in admin, so
+    browsers revalidate every time and get a 304 until a node is saved.
+    build() is only called when the client's copy is out of date. Pages
+    carrying flash messages are never cached.
+
+    Args:
+        scope: Name distinguishing this resource from other story views
+        build: Callable returning the response body
+    """
+    if session.get('_flashes'):
+        response = make_response(build())
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    etag = f"{scope}-{node_map.story_version()}-{current_user.get_id()}"
+    last_modified = node_map.story_last_modified()
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response(build())
+    else:
+        response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/admin/nodes')
 @admin_required
 def admin_nodes():
     """Admin node list"""
-    # Get all nodes
-    all_nodes = {node_id: node_map.get_node(node_id) for node_id in node_map.nodes.keys()}
+    def build():
+        # Get all nodes
+        all_nodes = {node_id: node_map.get_node(node_id) for node_id in node_map.nodes.keys()}
+        return render_template('admin/nodes.html', nodes=all_nodes)
+
+    return story_response('nodes', build)
 
-    return render_template('admin/nodes.html', nodes=all_nodes)
+@app.route('/admin/nodes.json')
+@admin_required
+def admin_nodes_json():
+    """Story graph for the flowchart: every node without its text"""
+    return story_response('nodes-json', lambda: jsonify(node_map.nodes.outline()))
 
 @app.route('/admin/flowchart')
 @admin_required
 def admin_flowchart():
-    """Admin flowchart view"""
-    # Get all nodes
-    all_nodes = {node_id: node_map.get_node(node_id) for node_id in node_map.nodes.keys()}
-    
-    return render_template('admin/flowchart.html', nodes=all_nodes)
+    """Admin flowchart view; the graph itself is loaded from admin_nodes_json"""
+    return story_response('flowchart', lambda: render_template('admin/flowchart.html'))
 
 @app.route('/admin/node/<node_id>')
 @admin_required
@@ -687,8 +872,9 @@ def admin_create_node():
             'next_node': request.form.get('next_node')
         }
         
-        node_map.nodes[node_id] = node_data
+        node_map.set_node(node_id, node_data)
         node_map.save_nodes()
+        node_fragments.invalidate(node_id)
         flash('Nó criado com sucesso!', 'success')
         return redirect(url_for('admin_node_detail', node_id=node_id))
         
@@ -727,8 +913,9 @@ def admin_edit_node(node_id):
         elif 'choices' in node:
             del node['choices']
         
-        node_map.nodes[node_id] = node
+        node_map.set_node(node_id, node)
         node_map.save_nodes()
+        node_fragments.invalidate(node_id)
         flash('Nó atualizado com sucesso!', 'success')
         return redirect(url_for('admin_node_detail', node_id=node_id))
         
@@ -739,8 +926,9 @@ def admin_edit_node(node_id):
 def admin_delete_node(node_id):
     """Delete a node"""
     if node_id in node_map.nodes:
-        del node_map.nodes[node_id]
+        node_map.delete_node(node_id)
         node_map.save_nodes()
+        node_fragments.invalidate(node_id)
         flash('Nó excluído com sucesso!', 'success')
     else:
         flash('Nó não encontrado.', 'danger')
@@ -763,9 +951,62 @@ def admin_delete_node(node_id):
 @app.route('/admin/characters')
 @admin_required
 def admin_characters():
-    """Admin character list"""
-    characters = db.get_all_characters()
-    return render_template('admin/characters.html', characters=characters)
+    """Admin character list, one page at a time"""
+    sort = request.args.get('sort', 'last_played')
+    if sort not in ('last_played', 'created_at'):
+        sort = 'last_played'
+    filters = {
+        'class': request.args.get('class', ''),
+        'gender': request.args.get('gender', ''),
+        'node': request.args.get('node', '').strip()
+    }
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    cursor = request.args.get('cursor')
+
+    characters, next_cursor = db.list_characters(sort=sort, cursor=cursor, limit=limit, **filters)
+
+    return render_template(
+        'admin/characters.html',
+        characters=characters,
+        total=db.count_characters(),
+        sort=sort,
+        filters=filters,
+        limit=limit,
+        cursor=cursor,
+        next_cursor=next_cursor,
+        classes=game_data.CHARACTER_CLASSES
+    )
+
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+def export_response(chunks, filename, fmt):
+    """Stream an export to the browser as a download"""
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'}
+    )
+
+@app.route('/admin/export/characters.<fmt>')
+@admin_required
+def admin_export_characters(fmt):
+    """Download every character as CSV or JSONL"""
+    if fmt not in export.FORMATS:
+        return 'Formato inválido', 404
+    return export_response(export.export_characters(db, fmt), 'characters', fmt)
+
+@app.route('/admin/export/node_visits.<fmt>')
+@admin_required
+def admin_export_node_visits(fmt):
+    """Download node visits as CSV or JSONL, optionally limited with ?since= and ?until="""
+    if fmt not in export.FORMATS:
+        return 'Formato inválido', 404
+    try:
+        start = export.parse_date(request.args.get('since'))
+        end = export.parse_date(request.args.get('until'), end=True)
+    except ValueError:
+        return 'Datas devem usar o formato YYYY-MM-DD', 400
+    return export_response(export.export_node_visits(db, fmt, start, end), 'node_visits', fmt)
 
 @app.route('/admin/character/<int:character_id>')
 @admin_required
@@ -777,8 +1018,8 @@ def admin_character_detail(character_id):
         flash('Personagem não encontrado.', 'danger')
         return redirect(url_for('admin_characters'))
 
-    # Get visited nodes
-    visited_nodes = db.get_node_visits_for_character(character_id)
+    # Visits per node, including history already folded into the rollups
+    visited_nodes = db.get_character_visit_summary(character_id)
 
     return render_template(
         'admin/character_detail.html',
@@ -788,6 +1029,22 @@ def admin_character_detail(character_id):
         abilities=json.loads(character['special_abilities']) if character['special_abilities'] else []
     )
 
+@app.route('/admin/stats/visit-writer')
+@admin_required
+def admin_visit_writer_stats():
+    """Queue and drop counters of the background visit writer"""
+    if visits is None:
+        return jsonify({'mode': 'sync'})
+    return jsonify(dict(visits.stats(), mode='async'))
+
+@app.route('/admin/stats/autosave')
+@admin_required
+def admin_autosave_stats():
+    """Marks, coalesced marks and writes of the autosave scheduler"""
+    if autosaves is None:
+        return jsonify({'mode': 'off'})
+    return jsonify(dict(autosaves.stats(), mode='on'))
+
 # Utility function to record node visits
 def record_node_visit(node_id):
     """Record a node visit in the database"""
@@ -796,7 +1053,10 @@ def record_node_visit(node_id):
         character_id = session['player']['id']
 
         # Create a node visit record
-        db.record_node_visit(node_id, character_id)
+        if visits is not None:
+            visits.record(node_id, character_id)
+        else:
+            db.record_node_visit(node_id, character_id)
 
 # Update the game route to record node visits
 original_game = app.view_functions['game']
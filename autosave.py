@@ -0,0 +1,161 @@
+"""
+Autosave Module - Saves players' progress from a background thread
+
+Story transitions only mark the player's state dirty; a flusher thread
+writes it to the player's autosave slot once the player has been idle for
+`debounce` seconds, or once the state has been dirty for `max_dirty_age`
+seconds, whichever comes first, but never more often than every
+`min_interval` seconds per player. Marks that arrive while a save is still
+pending replace it, so a burst of choices costs one write.
+"""
+
+import os
+import copy
+import time
+import atexit
+import threading
+
+import save_load
+
+class AutosaveScheduler:
+    def __init__(self, save=save_load.save_game, slot=save_load.AUTOSAVE_SLOT,
+                 debounce=5.0, min_interval=30.0, max_dirty_age=60.0):
+        """
+        Create an autosave scheduler
+
+        Args:
+            save: Function called as save(player, current_node, turn_counter, player_id, slot)
+            slot: Save slot the autosaves go to
+            debounce: Seconds without new marks before a dirty player is saved
+            min_interval: Least number of seconds between two saves of one player
+            max_dirty_age: Most seconds a player stays dirty while marks keep coming
+        """
+        self.save = save
+        self.slot = slot
+        self.debounce = debounce
+        self.min_interval = min_interval
+        self.max_dirty_age = max_dirty_age
+        self._pending = {}  # player_id -> [state, first marked, last marked]
+        self._last_saved = {}  # player_id -> time of the last save
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+        self._stats_lock = threading.Lock()
+        self.marked = 0
+        self.coalesced = 0
+        self.written = 0
+        self.errors = 0
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # Started lazily, and again after a fork, since threads do not survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    # Forked child: the parent's pending saves are the parent's to write
+                    self._pending = {}
+                    self._last_saved = {}
+                    self._cond = threading.Condition()
+                self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def mark_dirty(self, player_id, player, current_node, turn_counter):
+        """Schedule a save of the player's current state"""
+        self._ensure_started()
+        state = (copy.deepcopy(player), current_node, turn_counter)
+        now = time.monotonic()
+        with self._cond:
+            self.marked += 1
+            pending = self._pending.get(player_id)
+            if pending is None:
+                self._pending[player_id] = [state, now, now]
+            else:
+                self.coalesced += 1
+                pending[0] = state
+                pending[2] = now
+            self._cond.notify()
+
+    def _due_at(self, player_id, pending):
+        _, first_marked, last_marked = pending
+        due = min(last_marked + self.debounce, first_marked + self.max_dirty_age)
+        last_saved = self._last_saved.get(player_id)
+        if last_saved is not None:
+            due = max(due, last_saved + self.min_interval)
+        return due
+
+    def _take_due(self, flush_all=False):
+        """Remove and return the pending saves that are due, and when the next one is"""
+        now = time.monotonic()
+        due, next_due = [], None
+        for player_id, pending in list(self._pending.items()):
+            due_at = self._due_at(player_id, pending)
+            if flush_all or due_at <= now:
+                due.append((player_id, pending[0]))
+                del self._pending[player_id]
+                self._last_saved[player_id] = now
+            elif next_due is None or due_at < next_due:
+                next_due = due_at
+        # Forget players whose interval has passed; they are free to save at once
+        for player_id, saved_at in list(self._last_saved.items()):
+            if now - saved_at >= self.min_interval and player_id not in self._pending:
+                del self._last_saved[player_id]
+        return due, next_due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due, next_due = self._take_due(flush_all=self._stopping)
+                if not due:
+                    if self._stopping:
+                        return
+                    timeout = None if next_due is None else max(0, next_due - time.monotonic())
+                    self._cond.wait(timeout)
+                    continue
+            self._write(due)
+
+    def _write(self, due):
+        for player_id, (player, current_node, turn_counter) in due:
+            try:
+                if self.save(player, current_node, turn_counter, player_id, self.slot) is False:
+                    raise RuntimeError("save returned False")
+                with self._stats_lock:
+                    self.written += 1
+            except Exception as e:
+                with self._stats_lock:
+                    self.errors += 1
+                print(f"Erro no salvamento automático de {player_id}: {e}")
+
+    def flush(self):
+        """Write every pending save now, without waiting for its turn"""
+        with self._cond:
+            due, _ = self._take_due(flush_all=True)
+        self._write(due)
+
+    def stop(self, timeout=5):
+        """Write pending saves and stop the flusher thread"""
+        if self._pid != os.getpid() or self._stopping:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._cond:
+            pending = len(self._pending)
+            marked = self.marked
+            coalesced = self.coalesced
+        with self._stats_lock:
+            return {
+                'pending': pending,
+                'marked': marked,
+                'coalesced': coalesced,
+                'written': self.written,
+                'errors': self.errors
+            }
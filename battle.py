@@ -4,6 +4,7 @@ Battle Module - Handles the battle system
 
 import random
 import time
+import battle_engine
 from rich.panel import Panel
 from rich.progress import Progress
 from rich import box
@@ -95,12 +96,10 @@ def start_battle(console, player, enemy_id):
         time.sleep(1)
         
         # Calculate damage
-        base_damage = enemy["attack"]
-        if defending:
-            damage = max(1, base_damage - player.physical - random.randint(2, 5))
+        attack = battle_engine.resolve_enemy_attack(enemy, player.physical, defending)
+        damage = attack["damage"]
+        if attack["defended"]:
             console.print(f"[blue]Sua defesa reduziu o dano![/blue]")
-        else:
-            damage = max(1, base_damage - random.randint(0, 2))
         
         # Apply damage
         player.change_health(-damage)
@@ -139,21 +138,15 @@ def player_attack(console, player, enemy):
     console.print(f"Total do ataque: [bold magenta]{attack_value}[/bold magenta]")
     
     # Calculate damage
-    if roll == 20:  # Critical hit
-        damage = (player.physical * 2) + random.randint(3, 6)
-        console.print("[bold bright_green]Acerto crítico![/bold bright_green]")
-    elif roll == 1:  # Critical miss
-        damage = 0
-        console.print("[bold bright_red]Erro crítico! Você tropeça e erra o ataque![/bold bright_red]")
-    elif attack_value >= enemy["defense"] + 5:  # Strong hit
-        damage = player.physical + random.randint(2, 5)
-        console.print("[bold green]Ótimo golpe![/bold green]")
-    elif attack_value >= enemy["defense"]:  # Normal hit
-        damage = max(1, player.physical + random.randint(0, 3) - enemy["defense"] // 2)
-        console.print("[green]Você acerta o golpe.[/green]")
-    else:  # Miss
-        damage = 0
-        console.print("[red]Seu ataque foi bloqueado ou desviado.[/red]")
+    event = battle_engine.resolve_attack(player.physical, enemy, roll=roll)
+    damage = event["damage"]
+    console.print({
+        "critical": "[bold bright_green]Acerto crítico![/bold bright_green]",
+        "fumble": "[bold bright_red]Erro crítico! Você tropeça e erra o ataque![/bold bright_red]",
+        "strong": "[bold green]Ótimo golpe![/bold green]",
+        "hit": "[green]Você acerta o golpe.[/green]",
+        "miss": "[red]Seu ataque foi bloqueado ou desviado.[/red]"
+    }[event["outcome"]])
     
     if damage > 0:
         console.print(f"[bold red]Você causou {damage} pontos de dano![/bold red]")
@@ -184,44 +177,37 @@ def player_spirit(console, player, enemy):
     console.print(f"Total espiritual: [bold cyan]{spirit_value}[/bold cyan]")
     
     # Special effects based on roll
-    if roll == 20:  # Critical success
-        if random.random() < 0.5:  # 50% chance for damage
-            damage = player.spiritual * 2 + random.randint(2, 8)
-            console.print("[bold bright_cyan]Os Òrìṣà atendem seu chamado com poder imenso![/bold bright_cyan]")
-            console.print(f"[bold magenta]Você causa {damage} pontos de dano espiritual![/bold magenta]")
-            return damage
-        else:  # 50% chance for healing
-            heal_amount = player.spiritual + random.randint(3, 8)
-            player.heal(heal_amount)
-            console.print("[bold bright_green]Os Òrìṣà renovam sua força vital![/bold bright_green]")
-            console.print(f"[bold green]Você recupera {heal_amount} pontos de vida![/bold green]")
-            return 0
-    
-    elif roll == 1:  # Critical failure
-        backfire = random.randint(1, 4)
-        player.change_health(-backfire)
+    event = battle_engine.resolve_spirit(player.spiritual, enemy, roll=roll)
+    outcome = event["outcome"]
+    
+    if outcome == "critical_damage":
+        console.print("[bold bright_cyan]Os Òrìṣà atendem seu chamado com poder imenso![/bold bright_cyan]")
+        console.print(f"[bold magenta]Você causa {event['damage']} pontos de dano espiritual![/bold magenta]")
+    
+    elif outcome == "critical_heal":
+        player.heal(event["heal"])
+        console.print("[bold bright_green]Os Òrìṣà renovam sua força vital![/bold bright_green]")
+        console.print(f"[bold green]Você recupera {event['heal']} pontos de vida![/bold green]")
+    
+    elif outcome == "backfire":
+        player.change_health(-event["self_damage"])
         console.print("[bold bright_red]A energia espiritual se descontrola![/bold bright_red]")
-        console.print(f"[bold red]Você sofre {backfire} pontos de dano![/bold red]")
-        return 0
+        console.print(f"[bold red]Você sofre {event['self_damage']} pontos de dano![/bold red]")
     
-    elif spirit_value >= enemy.get("spirit_resistance", 10) + 5:  # Strong spiritual effect
-        damage = player.spiritual + random.randint(2, 5)
+    elif outcome == "strong":
         console.print("[bold cyan]A energia espiritual afeta profundamente o inimigo![/bold cyan]")
-        console.print(f"[bold magenta]Você causa {damage} pontos de dano espiritual![/bold magenta]")
-        return damage
+        console.print(f"[bold magenta]Você causa {event['damage']} pontos de dano espiritual![/bold magenta]")
     
-    elif spirit_value >= enemy.get("spirit_resistance", 10):  # Normal spiritual effect
-        damage = max(1, player.spiritual - enemy.get("spirit_resistance", 0) // 3)
-        heal_amount = random.randint(1, 3)
-        player.heal(heal_amount)
+    elif outcome == "hit":
+        player.heal(event["heal"])
         console.print("[cyan]Você canaliza energia espiritual.[/cyan]")
-        console.print(f"[magenta]Você causa {damage} pontos de dano espiritual![/magenta]")
-        console.print(f"[green]Você recupera {heal_amount} pontos de vida![/green]")
-        return damage
+        console.print(f"[magenta]Você causa {event['damage']} pontos de dano espiritual![/magenta]")
+        console.print(f"[green]Você recupera {event['heal']} pontos de vida![/green]")
     
     else:  # Failure
         console.print("[red]Você tenta canalizar energia espiritual, mas falha.[/red]")
-        return 0
+    
+    return event["damage"]
 
 def roll_battle_dice(console):
     """
@@ -244,7 +230,7 @@ def roll_battle_dice(console):
             progress.update(task, advance=12.5)
             time.sleep(0.15)
     
-    result = random.randint(1, 20)
+    result = battle_engine.roll_d20()
     
     if result == 20:
         console.print(f"[bold bright_green]Rolagem: {result}[/bold bright_green] [bright_green]Sucesso crítico![/bright_green]")
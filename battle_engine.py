@@ -0,0 +1,227 @@
+"""
+Battle Engine Module - Battle rules shared by the console game and the web app
+
+Nothing here prints or sleeps. Functions take an rng argument (anything
+with randint() and random(), e.g. the random module or a seeded
+random.Random), work on plain dicts and return event dicts that the caller
+renders however it likes.
+"""
+
+import random
+
+ACTIONS = ("attack", "defend", "spirit")
+
+# Outcomes that count as a successful action for display purposes
+SUCCESS_OUTCOMES = {"critical", "strong", "hit", "defend", "critical_damage", "critical_heal"}
+
+def roll_d20(rng=random):
+    """Roll a twenty-sided die"""
+    return rng.randint(1, 20)
+
+def resolve_attack(physical, enemy, rng=random, roll=None):
+    """
+    Resolve a physical attack
+
+    Args:
+        physical: Player's physical attribute
+        enemy: Enemy data dictionary
+        rng: Random number source
+        roll: d20 result, rolled here if not given
+
+    Returns:
+        dict: Event with roll, total, outcome and damage
+    """
+    if roll is None:
+        roll = roll_d20(rng)
+    total = roll + physical
+
+    if roll == 20:  # Critical hit
+        outcome, damage = "critical", (physical * 2) + rng.randint(3, 6)
+    elif roll == 1:  # Critical miss
+        outcome, damage = "fumble", 0
+    elif total >= enemy["defense"] + 5:  # Strong hit
+        outcome, damage = "strong", physical + rng.randint(2, 5)
+    elif total >= enemy["defense"]:  # Normal hit
+        outcome, damage = "hit", max(1, physical + rng.randint(0, 3) - enemy["defense"] // 2)
+    else:  # Miss
+        outcome, damage = "miss", 0
+
+    return {"type": "attack", "roll": roll, "total": total, "outcome": outcome,
+            "damage": damage, "heal": 0, "self_damage": 0}
+
+def resolve_spirit(spiritual, enemy, rng=random, roll=None):
+    """
+    Resolve a spiritual action
+
+    Args:
+        spiritual: Player's spiritual attribute
+        enemy: Enemy data dictionary
+        rng: Random number source
+        roll: d20 result, rolled here if not given
+
+    Returns:
+        dict: Event with roll, total, outcome, damage, heal and self_damage
+    """
+    if roll is None:
+        roll = roll_d20(rng)
+    total = roll + spiritual
+    resistance = enemy.get("spirit_resistance", 10)
+    damage = heal = self_damage = 0
+
+    if roll == 20:  # Critical success
+        if rng.random() < 0.5:  # 50% chance for damage
+            outcome, damage = "critical_damage", spiritual * 2 + rng.randint(2, 8)
+        else:  # 50% chance for healing
+            outcome, heal = "critical_heal", spiritual + rng.randint(3, 8)
+    elif roll == 1:  # Critical failure
+        outcome, self_damage = "backfire", rng.randint(1, 4)
+    elif total >= resistance + 5:  # Strong spiritual effect
+        outcome, damage = "strong", spiritual + rng.randint(2, 5)
+    elif total >= resistance:  # Normal spiritual effect
+        outcome, damage = "hit", max(1, spiritual - resistance // 3)
+        heal = rng.randint(1, 3)
+    else:  # Failure
+        outcome = "fail"
+
+    return {"type": "spirit", "roll": roll, "total": total, "outcome": outcome,
+            "damage": damage, "heal": heal, "self_damage": self_damage}
+
+def resolve_enemy_attack(enemy, physical, defending, rng=random):
+    """
+    Resolve the enemy's attack
+
+    Args:
+        enemy: Enemy data dictionary
+        physical: Player's physical attribute, used when defending
+        defending: Whether the player took a defensive stance this round
+        rng: Random number source
+
+    Returns:
+        dict: Event with the damage dealt to the player
+    """
+    base_damage = enemy["attack"]
+    if defending:
+        damage = max(1, base_damage - physical - rng.randint(2, 5))
+    else:
+        damage = max(1, base_damage - rng.randint(0, 2))
+    return {"type": "enemy_attack", "defended": defending, "damage": damage}
+
+def change_health(combatant, amount):
+    """Change a combatant dict's current_health, capped between 0 and max_health"""
+    health = combatant["current_health"] + amount
+    if "max_health" in combatant:
+        health = min(health, combatant["max_health"])
+    combatant["current_health"] = max(0, health)
+
+def play_round(player, enemy, action, rng=random):
+    """
+    Resolve one battle round: the player's action, then the enemy's reply
+
+    The player and enemy dicts are updated in place.
+
+    Args:
+        player: Player dict with physical, spiritual, current_health, max_health
+        enemy: Enemy dict with attack, defense, spirit_resistance, current_health
+        action: One of ACTIONS
+        rng: Random number source
+
+    Returns:
+        dict: roll, events (player event first, then the enemy attack if any)
+              and result ("victory", "defeat" or None while the battle goes on)
+    """
+    roll = roll_d20(rng)
+    if action == "attack":
+        event = resolve_attack(player["physical"], enemy, rng, roll)
+    elif action == "spirit":
+        event = resolve_spirit(player["spiritual"], enemy, rng, roll)
+    elif action == "defend":
+        event = {"type": "defend", "roll": roll, "outcome": "defend",
+                 "damage": 0, "heal": 0, "self_damage": 0}
+    else:
+        event = {"type": "idle", "roll": roll, "outcome": "idle",
+                 "damage": 0, "heal": 0, "self_damage": 0}
+
+    change_health(enemy, -event["damage"])
+    change_health(player, event["heal"] - event["self_damage"])
+    events = [event]
+
+    if enemy["current_health"] > 0:
+        enemy_event = resolve_enemy_attack(enemy, player["physical"], action == "defend", rng)
+        change_health(player, -enemy_event["damage"])
+        events.append(enemy_event)
+
+    if enemy["current_health"] <= 0:
+        result = "victory"
+    elif player["current_health"] <= 0:
+        result = "defeat"
+    else:
+        result = None
+    return {"roll": roll, "events": events, "result": result}
+
+def apply_rewards(player, rewards):
+    """
+    Apply an enemy's rewards to a player dict
+
+    Returns:
+        dict: Event listing what was gained
+    """
+    event = {"type": "rewards", "attribute": None, "item": None, "health": 0}
+
+    if "attribute" in rewards:
+        attr_type = rewards["attribute"]["type"]
+        attr_amount = rewards["attribute"]["amount"]
+        player[attr_type] = player.get(attr_type, 0) + attr_amount
+        event["attribute"] = {"type": attr_type, "amount": attr_amount}
+
+    if "item" in rewards:
+        player.setdefault("inventory", []).append(rewards["item"])
+        event["item"] = rewards["item"]
+
+    if "health" in rewards:
+        change_health(player, rewards["health"])
+        event["health"] = rewards["health"]
+
+    return event
+
+def is_success(event):
+    """Whether an event should be shown as a success"""
+    return event.get("outcome") in SUCCESS_OUTCOMES
+
+def describe(event):
+    """Return the web interface message for an event"""
+    kind = event["type"]
+    outcome = event.get("outcome")
+
+    if kind == "attack":
+        return {
+            "critical": f"Acerto crítico! Você causou {event['damage']} pontos de dano!",
+            "fumble": "Erro crítico! Você tropeça e erra o ataque!",
+            "strong": f"Ótimo golpe! Você causou {event['damage']} pontos de dano!",
+            "hit": f"Você acerta o golpe e causa {event['damage']} pontos de dano.",
+            "miss": "Seu ataque foi bloqueado ou desviado."
+        }[outcome]
+    if kind == "spirit":
+        return {
+            "critical_damage": f"Os Òrìṣà atendem seu chamado com poder imenso! Você causa {event['damage']} pontos de dano espiritual!",
+            "critical_heal": f"Os Òrìṣà renovam sua força vital! Você recupera {event['heal']} pontos de vida!",
+            "backfire": f"A energia espiritual se descontrola! Você sofre {event['self_damage']} pontos de dano!",
+            "strong": f"A energia espiritual afeta profundamente o inimigo! Você causa {event['damage']} pontos de dano espiritual!",
+            "hit": f"Você canaliza energia espiritual e causa {event['damage']} pontos de dano! Também recupera {event['heal']} pontos de vida.",
+            "fail": "Você tenta canalizar energia espiritual, mas falha."
+        }[outcome]
+    if kind == "defend":
+        return "Você assume uma postura defensiva!"
+    if kind == "enemy_attack":
+        if event["defended"]:
+            return f"Sua defesa reduziu o dano! Você recebe {event['damage']} pontos de dano."
+        return f"Você recebe {event['damage']} pontos de dano!"
+    if kind == "rewards":
+        gains = []
+        if event["attribute"]:
+            gains.append(f"+{event['attribute']['amount']} {event['attribute']['type']}")
+        if event["item"]:
+            gains.append(event["item"])
+        if event["health"]:
+            gains.append(f"+{event['health']} de vida")
+        return "Você ganhou: " + ", ".join(gains) if gains else "Você ganhou"
+    return ""
@@ -0,0 +1,84 @@
+"""
+Battle Log Module - Fixed-size battle log with sequence numbers
+
+Every message gets an increasing sequence number, so a client that has
+already shown messages up to some number can ask for just the newer ones.
+Only the newest `capacity` messages are kept.
+"""
+
+from collections import deque
+from itertools import islice
+
+DEFAULT_CAPACITY = 50
+
+class BattleLog:
+    def __init__(self, capacity=DEFAULT_CAPACITY, entries=(), next_seq=1):
+        """
+        Create a battle log
+
+        Args:
+            capacity (int): Number of messages kept
+            entries: Existing [seq, message] pairs, oldest first
+            next_seq (int): Sequence number for the next message
+        """
+        self.entries = deque((list(entry) for entry in entries), maxlen=capacity)
+        self.next_seq = next_seq
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest message (0 if empty)"""
+        return self.next_seq - 1
+
+    def append(self, message):
+        """
+        Add a message, dropping the oldest one if the log is full
+
+        Returns:
+            int: The message's sequence number
+        """
+        seq = self.next_seq
+        self.entries.append([seq, message])
+        self.next_seq += 1
+        return seq
+
+    def since(self, seq):
+        """
+        Messages newer than seq, oldest first
+
+        Returns:
+            list: [seq, message] pairs
+        """
+        if not self.entries:
+            return []
+        # Sequence numbers are consecutive, so the start position is arithmetic
+        start = max(0, seq - self.entries[0][0] + 1)
+        return [list(entry) for entry in islice(self.entries, start, None)]
+
+    def newest_first(self):
+        """Messages for display, newest first"""
+        return [message for _, message in reversed(self.entries)]
+
+    def to_dict(self):
+        """Serializable form for the session"""
+        return {
+            'capacity': self.entries.maxlen,
+            'next_seq': self.next_seq,
+            'entries': list(self.entries)
+        }
+
+    @classmethod
+    def from_dict(cls, data, capacity=DEFAULT_CAPACITY):
+        """
+        Rebuild a log from to_dict() output
+
+        A plain list of messages (newest first, the old session format) is
+        also accepted.
+        """
+        if not data:
+            return cls(capacity)
+        if isinstance(data, list):
+            log = cls(capacity)
+            for message in reversed(data):
+                log.append(message)
+            return log
+        return cls(data.get('capacity', capacity), data['entries'], data['next_seq'])
@@ -0,0 +1,228 @@
+"""
+Battle Simulator Module - Monte Carlo balance report for classes and enemies
+
+Runs many battles at once with NumPy, one array element per battle, using
+the same rules as battle_engine.play_round. Usage:
+
+    python battle_sim.py --battles 100000 --seed 1
+"""
+
+import argparse
+import random
+import sys
+
+import battle_engine
+import game_data
+
+try:
+    import numpy as np
+except ImportError:  # Only needed for the simulator; install the "sim" extra
+    np = None
+
+# Action codes used inside the vectorized simulation
+ATTACK, DEFEND, SPIRIT = 0, 1, 2
+
+POLICIES = {
+    "attack": "Always attack",
+    "spirit": "Always use spirit",
+    "random": "Pick attack, defend or spirit uniformly at random"
+}
+
+MAX_TURNS = 200
+
+def character_stats(character_class, gender):
+    """
+    Starting attributes for a class/gender pair, as player.Player computes them
+
+    Returns:
+        dict: physical, spiritual, mental and max_health
+    """
+    class_data = game_data.CHARACTER_CLASSES[character_class]
+    stats = dict(class_data["base_attributes"])
+    for attribute, amount in class_data["gender_mods"].get(gender, {}).items():
+        stats[attribute] += amount
+    stats["max_health"] = 20 + stats["physical"]
+    return stats
+
+def _choose_actions(policy, rng, n):
+    if policy == "attack":
+        return np.full(n, ATTACK)
+    if policy == "spirit":
+        return np.full(n, SPIRIT)
+    return rng.integers(0, 3, n)
+
+def simulate(stats, enemy, policy, battles, rng, max_turns=MAX_TURNS):
+    """
+    Simulate a batch of battles between one character build and one enemy
+
+    Args:
+        stats: Output of character_stats
+        enemy: Enemy data dictionary from game_data.ENEMIES
+        policy: Key of POLICIES
+        battles: Number of battles to run
+        rng: numpy.random.Generator
+        max_turns: Battles still running after this many rounds count as draws
+
+    Returns:
+        dict: wins, losses, draws and the mean number of rounds per finished battle
+    """
+    if np is None:
+        raise RuntimeError("battle_sim needs NumPy: pip install numpy")
+
+    physical, spiritual, max_health = stats["physical"], stats["spiritual"], stats["max_health"]
+    defense, attack = enemy["defense"], enemy["attack"]
+    resistance = enemy.get("spirit_resistance", 10)
+
+    player_hp = np.full(battles, max_health)
+    enemy_hp = np.full(battles, enemy["health"])
+    turns = np.zeros(battles, dtype=np.int64)
+    outcome = np.zeros(battles, dtype=np.int8)  # 0 running, 1 victory, -1 defeat
+    active = np.arange(battles)
+
+    for turn in range(1, max_turns + 1):
+        n = active.size
+        if n == 0:
+            break
+        p_hp = player_hp[active]
+        e_hp = enemy_hp[active]
+        actions = _choose_actions(policy, rng, n)
+        roll = rng.integers(1, 21, n)
+
+        # Physical attack (battle_engine.resolve_attack)
+        total = roll + physical
+        attack_damage = np.select(
+            [roll == 20, roll == 1, total >= defense + 5, total >= defense],
+            [physical * 2 + rng.integers(3, 7, n), 0, physical + rng.integers(2, 6, n),
+             np.maximum(1, physical + rng.integers(0, 4, n) - defense // 2)],
+            0
+        )
+
+        # Spiritual action (battle_engine.resolve_spirit)
+        total = roll + spiritual
+        critical = roll == 20
+        critical_damage = critical & (rng.random(n) < 0.5)
+        critical_heal = critical & ~critical_damage
+        backfire = roll == 1
+        strong = ~critical & ~backfire & (total >= resistance + 5)
+        normal = ~critical & ~backfire & ~strong & (total >= resistance)
+        spirit_damage = np.select(
+            [critical_damage, strong, normal],
+            [spiritual * 2 + rng.integers(2, 9, n), spiritual + rng.integers(2, 6, n),
+             max(1, spiritual - resistance // 3)],
+            0
+        )
+        spirit_heal = np.select(
+            [critical_heal, normal],
+            [spiritual + rng.integers(3, 9, n), rng.integers(1, 4, n)],
+            0
+        )
+        self_damage = np.where(backfire, rng.integers(1, 5, n), 0)
+
+        is_attack = actions == ATTACK
+        is_spirit = actions == SPIRIT
+        damage = np.where(is_attack, attack_damage, 0) + np.where(is_spirit, spirit_damage, 0)
+        heal = np.where(is_spirit, spirit_heal - self_damage, 0)
+        e_hp = np.maximum(0, e_hp - damage)
+        p_hp = np.clip(p_hp + heal, 0, max_health)
+
+        # Enemy reply (battle_engine.resolve_enemy_attack)
+        enemy_alive = e_hp > 0
+        defended = np.maximum(1, attack - physical - rng.integers(2, 6, n))
+        undefended = np.maximum(1, attack - rng.integers(0, 3, n))
+        enemy_damage = np.where(actions == DEFEND, defended, undefended)
+        p_hp = np.maximum(0, p_hp - np.where(enemy_alive, enemy_damage, 0))
+
+        player_hp[active] = p_hp
+        enemy_hp[active] = e_hp
+        won = ~enemy_alive
+        lost = enemy_alive & (p_hp <= 0)
+        finished = won | lost
+        outcome[active[won]] = 1
+        outcome[active[lost]] = -1
+        turns[active[finished]] = turn
+        active = active[~finished]
+
+    done = outcome != 0
+    return {
+        "wins": int((outcome == 1).sum()),
+        "losses": int((outcome == -1).sum()),
+        "draws": int((~done).sum()),
+        "mean_turns": float(turns[done].mean()) if done.any() else 0.0
+    }
+
+def engine_win_rate(stats, enemy, policy, battles, seed=None):
+    """
+    Scalar cross-check: the same matchup played through battle_engine.play_round
+
+    Returns:
+        float: Fraction of battles won
+    """
+    rng = random.Random(seed)
+    wins = 0
+    for _ in range(battles):
+        player_data = {"physical": stats["physical"], "spiritual": stats["spiritual"],
+                       "current_health": stats["max_health"], "max_health": stats["max_health"]}
+        enemy_data = dict(enemy, current_health=enemy["health"], max_health=enemy["health"])
+        for _ in range(MAX_TURNS):
+            action = policy if policy in battle_engine.ACTIONS else rng.choice(battle_engine.ACTIONS)
+            result = battle_engine.play_round(player_data, enemy_data, action, rng)["result"]
+            if result:
+                wins += result == "victory"
+                break
+    return wins / battles
+
+def balance_report(battles, policies=None, enemies=None, seed=None):
+    """
+    Simulate every class/gender build against every enemy under each policy
+
+    Returns:
+        list: One dict per matchup with win_rate, loss_rate, draw_rate and mean_turns
+    """
+    rng = np.random.default_rng(seed) if np is not None else None
+    rows = []
+    for character_class, class_data in game_data.CHARACTER_CLASSES.items():
+        for gender in class_data["gender_mods"]:
+            stats = character_stats(character_class, gender)
+            for enemy_id in enemies or game_data.ENEMIES:
+                enemy = game_data.ENEMIES[enemy_id]
+                for policy in policies or POLICIES:
+                    result = simulate(stats, enemy, policy, battles, rng)
+                    rows.append({
+                        "class": character_class,
+                        "gender": gender,
+                        "enemy": enemy_id,
+                        "policy": policy,
+                        "win_rate": result["wins"] / battles,
+                        "loss_rate": result["losses"] / battles,
+                        "draw_rate": result["draws"] / battles,
+                        "mean_turns": result["mean_turns"]
+                    })
+    return rows
+
+def format_report(rows):
+    """Render balance_report rows as a plain-text table"""
+    header = f"{'Classe':<12}{'Gênero':<8}{'Inimigo':<13}{'Política':<9}{'Vitória':>9}{'Derrota':>9}{'Empate':>8}{'Turnos':>8}"
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['class']:<12}{row['gender']:<8}{row['enemy']:<13}{row['policy']:<9}"
+            f"{row['win_rate']:>9.1%}{row['loss_rate']:>9.1%}{row['draw_rate']:>8.1%}{row['mean_turns']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Relatório de balanceamento das batalhas")
+    parser.add_argument("--battles", type=int, default=100000, help="battles per matchup")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES), help="repeatable; default: all")
+    parser.add_argument("--enemy", action="append", choices=sorted(game_data.ENEMIES), help="repeatable; default: all")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("battle_sim precisa do NumPy: pip install numpy", file=sys.stderr)
+        return 1
+    print(format_report(balance_report(args.battles, args.policy, args.enemy, args.seed)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
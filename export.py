@@ -0,0 +1,95 @@
+"""
+Export Module - Stream characters and node visits as CSV or JSON Lines
+
+Rows are written one at a time from a generator, so exports of any size
+use constant memory. Used by the admin export routes and the `flask export`
+command.
+"""
+
+import io
+import csv
+import json
+from datetime import datetime, timedelta
+
+FORMATS = ("csv", "jsonl")
+
+CHARACTER_FIELDS = (
+    "id", "name", "character_class", "gender", "mental", "physical", "spiritual",
+    "max_health", "current_health", "inventory", "special_abilities", "current_node",
+    "created_at", "last_played"
+)
+VISIT_FIELDS = ("id", "node_id", "character_id", "visited_at")
+
+# Rows buffered into each chunk handed to the WSGI server
+CHUNK_ROWS = 200
+
+def parse_date(value, end=False):
+    """
+    Parse a YYYY-MM-DD or ISO datetime filter value
+
+    A bare date used as an end bound means the end of that day.
+
+    Returns:
+        datetime: The parsed value, or None for an empty value
+
+    Raises:
+        ValueError: If the value is not a valid date
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+def _character_row(character):
+    row = dict(character)
+    if "character_class" not in row and "class" in row:
+        row["character_class"] = row.pop("class")
+    return row
+
+def _cell(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return "" if value is None else value
+
+def stream(rows, fields, fmt):
+    """
+    Serialize rows lazily
+
+    Args:
+        rows: Iterable of dicts
+        fields: Columns to write, in order
+        fmt: "csv" or "jsonl"
+
+    Yields:
+        str: Chunks of CSV or JSON Lines text
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(fields)
+
+    for count, row in enumerate(rows, 1):
+        if writer:
+            writer.writerow([_cell(row.get(field)) for field in fields])
+        else:
+            buffer.write(json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False, default=str))
+            buffer.write("\n")
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_characters(db, fmt):
+    """Stream every character from a storage backend"""
+    return stream((_character_row(character) for character in db.iter_characters()), CHARACTER_FIELDS, fmt)
+
+def export_node_visits(db, fmt, start=None, end=None):
+    """Stream node visits from a storage backend, optionally limited to [start, end)"""
+    return stream(db.iter_node_visits(start, end), VISIT_FIELDS, fmt)
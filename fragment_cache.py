@@ -0,0 +1,60 @@
+"""
+Fragment Cache Module - Rendered HTML fragments kept in memory
+
+Entries are keyed by (name, version) tuples. A new version simply misses
+the cache, and the stale entry ages out of the LRU; invalidate() drops every
+version of a name at once.
+"""
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_SIZE = 512
+
+class FragmentCache:
+    """Bounded LRU of rendered fragments"""
+
+    def __init__(self, max_entries=DEFAULT_SIZE):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # (name, version) -> html
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, version):
+        """Cached fragment, or None"""
+        key = (name, version)
+        with self._lock:
+            html = self._data.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, name, version, html):
+        """Store a fragment, evicting the least recently used ones if full"""
+        with self._lock:
+            self._data[(name, version)] = html
+            self._data.move_to_end((name, version))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_render(self, name, version, render):
+        """Cached fragment, rendering and storing it with render() on a miss"""
+        html = self.get(name, version)
+        if html is None:
+            html = render()
+            self.set(name, version, html)
+        return html
+
+    def invalidate(self, name):
+        """Drop every cached version of a fragment"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] == name]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
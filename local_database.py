@@ -31,13 +31,63 @@ Local Database Module - Handles all database operations using local JSON files
 
 import os
 import json
-from datetime import datetime
+import time
+import atexit
+import heapq
+import base64
+import bisect
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from locking import file_lock
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking becomes a no-op there
+    fcntl = None
 
 # Define file paths
 DATA_DIR = "data"
 ADMIN_FILE = os.path.join(DATA_DIR, "admins.json")
 CHARACTER_FILE = os.path.join(DATA_DIR, "characters.json")
-NODE_VISITS_FILE = os.path.join(DATA_DIR, "node_visits.json")
+NODE_VISITS_FILE = os.path.join(DATA_DIR, "node_visits.json")  # legacy array format
+NODE_VISITS_LOG = os.path.join(DATA_DIR, "node_visits.jsonl")
+NODE_VISIT_ROLLUPS_FILE = os.path.join(DATA_DIR, "node_visit_rollups.json")
+
+# Visit journal settings: the journal is append-only JSON Lines, and fsync is
+# batched so a burst of visits costs one disk flush instead of one per visit.
+VISIT_FSYNC_EVERY = 32
+VISIT_FSYNC_INTERVAL = 1.0
+
+# compact_node_visits keeps raw visits for this many days and folds older
+# ones into per-node/day and per-character rollups
+VISIT_RETENTION_DAYS = 30
+
+_visit_log = None
+_visit_lock_file = None
+_visit_pid = None  # process that opened _visit_log and _visit_lock_file
+_visit_write_lock = threading.RLock()
+_visit_next_id = None
+_visit_log_end = None  # journal size after this process's last append
+_visit_unsynced = 0
+_visit_last_sync = 0.0
+
+# In-process read cache. Each entry is validated against the file's inode,
+# size and mtime, so a write by another gunicorn worker invalidates it too.
+_cache = {}
+_visit_index = None
+
+# Character updates arriving within this window are merged and written with a
+# single read-modify-write of the characters file.
+WRITE_COALESCE_WINDOW = 0.5
+
+# Number of most visited nodes tracked incrementally for the admin dashboard
+TOP_NODES_TRACKED = 10
+
+_pending_updates = {}
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flush_timer = None
 
 def ensure_data_dir():
     """Ensure data directory exists"""
@@ -56,10 +106,12 @@ def ensure_data_dir():
         with open(ADMIN_FILE, 'w', encoding='utf-8') as f:
             json.dump(admins, f, indent=2)
 
-    for file_name in [CHARACTER_FILE, NODE_VISITS_FILE]:
-        if not os.path.exists(file_name):
-            with open(file_name, 'w', encoding='utf-8') as f:
-                json.dump([], f, indent=2)
+    if not os.path.exists(CHARACTER_FILE):
+        with open(CHARACTER_FILE, 'w', encoding='utf-8') as f:
+            json.dump([], f, indent=2)
+
+    if not os.path.exists(NODE_VISITS_LOG):
+        migrate_legacy_visits()
 
 def load_json(file_path, default=None):
     """Load JSON data from file"""
@@ -72,40 +124,106 @@ def load_json(file_path, default=None):
         print(f"Error reading {file_path}, returning default value")
         return default if default is not None else {}
 
+def file_signature(file_path):
+    """Return a cheap fingerprint of a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def load_cached(file_path, default, build_index):
+    """Load a JSON file through the cache, rebuilding its index when the file changes"""
+    signature = file_signature(file_path)
+    entry = _cache.get(file_path)
+    if entry is None or entry[0] != signature:
+        entry = (signature, build_index(load_json(file_path, default)))
+        _cache[file_path] = entry
+    return entry[1]
+
+def invalidate_cache(file_path=None):
+    """Drop cached data for one file, or for all files"""
+    global _visit_index
+    if file_path is None:
+        _cache.clear()
+        _visit_index = None
+    else:
+        _cache.pop(file_path, None)
+
+def _admin_index():
+    return load_cached(ADMIN_FILE, {}, lambda admins: admins)
+
+def _character_index(flush=True):
+    # Readers see queued updates; update_character only checks ids, so it
+    # passes flush=False to keep other characters' updates coalesced
+    if flush and _pending_updates:
+        flush_pending_writes()
+
+    def build(characters):
+        index = {
+            'all': characters,
+            'by_id': {char['id']: char for char in characters},
+            'recent': sorted(characters, key=lambda x: str(x.get('created_at', '')), reverse=True),
+            # Ascending (sort value, id) keys for keyset pagination
+            'sorted': {field: sorted((_sort_value(char, field), char['id']) for char in characters)
+                       for field in CHARACTER_SORT_FIELDS}
+        }
+        # Secondary indexes: filter value -> set of character ids
+        for name, field in CHARACTER_FILTERS.items():
+            ids = index['by_' + name] = {}
+            for char in characters:
+                ids.setdefault(_filter_value(char, field), set()).add(char['id'])
+        return index
+    return load_cached(CHARACTER_FILE, [], build)
+
 def save_json(file_path, data):
-    """Save data to JSON file"""
+    """Save data to JSON file atomically (write a temp file, then rename it over the target)"""
     ensure_data_dir()
+    invalidate_cache(file_path)
+    directory = os.path.dirname(file_path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path), suffix='.tmp')
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         print(f"Error saving to {file_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
         return False
 
 # Admin operations
 def create_admin(admin_data):
     """Create a new admin"""
-    admins = load_json(ADMIN_FILE, {})
-    username = admin_data['username']
-    if username not in admins:
-        admins[username] = {
-            'password_hash': admin_data['password_hash'],
-            'created_at': datetime.utcnow(),
-            'last_login': None
-        }
-        save_json(ADMIN_FILE, admins)
-        return True
+    with file_lock(ADMIN_FILE):
+        admins = load_json(ADMIN_FILE, {})
+        username = admin_data['username']
+        if username not in admins:
+            admins[username] = {
+                'password_hash': admin_data['password_hash'],
+                'created_at': datetime.utcnow(),
+                'last_login': None
+            }
+            save_json(ADMIN_FILE, admins)
+            return True
     return False
 
 def get_admin(username):
     """Get admin by username"""
-    admins = load_json(ADMIN_FILE, {})
-    return admins.get(username)
+    return _admin_index().get(username)
 
 def get_admin_by_username(username):
     """Get admin by username"""
-    admins = load_json(ADMIN_FILE, {})
+    admins = _admin_index()
     if username in admins:
         admin_data = admins[username]
         return Admin(
@@ -118,107 +236,542 @@ def get_admin_by_username(username):
 
 def update_admin_login(username):
     """Update admin's last login"""
-    admins = load_json(ADMIN_FILE, {})
-    if username in admins:
-        admins[username]['last_login'] = datetime.utcnow().isoformat()
-        save_json(ADMIN_FILE, admins)
-        return True
+    with file_lock(ADMIN_FILE):
+        admins = load_json(ADMIN_FILE, {})
+        if username in admins:
+            admins[username]['last_login'] = datetime.utcnow().isoformat()
+            save_json(ADMIN_FILE, admins)
+            return True
     return False
 
 # Character operations
 def create_character(data):
     """Create a new character"""
-    characters = load_json(CHARACTER_FILE, [])
-    char_id = len(characters) + 1
-    data['id'] = char_id
-    data['created_at'] = datetime.utcnow()
-    data['last_played'] = datetime.utcnow()
-    characters.append(data)
-    save_json(CHARACTER_FILE, characters)
+    with file_lock(CHARACTER_FILE):
+        characters = load_json(CHARACTER_FILE, [])
+        char_id = max((char['id'] for char in characters), default=0) + 1
+        data['id'] = char_id
+        data['created_at'] = datetime.utcnow()
+        data['last_played'] = datetime.utcnow()
+        characters.append(data)
+        save_json(CHARACTER_FILE, characters)
     return char_id
 
 def get_character(char_id):
     """Get character by ID"""
-    characters = load_json(CHARACTER_FILE, [])
-    for char in characters:
-        if char['id'] == char_id:
-            return char
-    return None
+    return _character_index()['by_id'].get(char_id)
 
 def update_character(char_id, data):
-    """Update character data"""
-    characters = load_json(CHARACTER_FILE, [])
-    for i, char in enumerate(characters):
-        if char['id'] == char_id:
-            characters[i].update(data)
-            characters[i]['last_played'] = datetime.utcnow()
+    """Queue a character update; bursts are written together by flush_pending_writes"""
+    global _flush_timer
+    if char_id not in _pending_updates and char_id not in _character_index(flush=False)['by_id']:
+        return False
+    with _pending_lock:
+        pending = _pending_updates.setdefault(char_id, {})
+        pending.update(data)
+        pending['last_played'] = datetime.utcnow()
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(WRITE_COALESCE_WINDOW, flush_pending_writes)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    return True
+
+def flush_pending_writes():
+    """Write all queued character updates in one locked read-modify-write"""
+    global _flush_timer
+    with _flush_lock:
+        with _pending_lock:
+            updates = dict(_pending_updates)
+            _pending_updates.clear()
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        if not updates:
+            return
+        with file_lock(CHARACTER_FILE):
+            characters = load_json(CHARACTER_FILE, [])
+            for char in characters:
+                if char['id'] in updates:
+                    char.update(updates[char['id']])
             save_json(CHARACTER_FILE, characters)
-            return True
-    return False
+
+atexit.register(flush_pending_writes)
 
 def get_all_characters():
     """Get all characters"""
-    return load_json(CHARACTER_FILE, [])
+    return list(_character_index()['all'])
+
+def iter_characters():
+    """Stream all characters in id order"""
+    yield from _character_index()['all']
 
 def count_characters():
     """Count total number of characters"""
-    characters = load_json(CHARACTER_FILE, [])
-    return len(characters)
+    return len(_character_index()['all'])
 
 def count_node_visits():
     """Count total number of node visits"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    return len(visits)
+    return _visits()['count']
 
 def count_node_visits_for_node(node_id):
     """Count visits for a specific node"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    return len([v for v in visits if v['node_id'] == node_id])
+    return _visits()['counts'].get(node_id, 0)
 
 def get_top_visited_nodes(limit=5):
     """Get most visited nodes"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    node_counts = {}
-    for visit in visits:
-        node_id = visit['node_id']
-        node_counts[node_id] = node_counts.get(node_id, 0) + 1
-    
-    sorted_nodes = sorted(node_counts.items(), key=lambda x: x[1], reverse=True)
+    index = _visits()
+    if limit <= index['top'].size:
+        sorted_nodes = index['top'].items()
+    else:
+        sorted_nodes = sorted(index['counts'].items(), key=lambda x: x[1], reverse=True)
     return [{'node_id': node_id, 'visit_count': count} for node_id, count in sorted_nodes[:limit]]
 
 def get_recent_characters(limit=5):
     """Get most recently created characters"""
-    characters = load_json(CHARACTER_FILE, [])
-    sorted_chars = sorted(characters, key=lambda x: x.get('created_at', ''), reverse=True)
-    return sorted_chars[:limit]
+    return _character_index()['recent'][:limit]
+
+# Character list pagination
+CHARACTER_SORT_FIELDS = ('last_played', 'created_at')
+# list_characters keyword -> character field
+CHARACTER_FILTERS = {'class': 'character_class', 'gender': 'gender', 'node': 'current_node'}
+
+def _sort_value(char, field):
+    value = char.get(field)
+    return '' if value is None else str(value)
+
+def _filter_value(char, field):
+    if field == 'character_class' and field not in char:
+        return char.get('class')
+    return char.get(field)
+
+def encode_cursor(sort_value, char_id):
+    """Opaque pagination cursor for the last character of a page"""
+    return base64.urlsafe_b64encode(f"{sort_value}|{char_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    """Return the (sort value, id) pair of a cursor, or None if it is invalid"""
+    try:
+        sort_value, char_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return sort_value, int(char_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def list_characters(sort='last_played', cursor=None, limit=50, **filters):
+    """
+    Get one page of characters, newest first
+
+    Args:
+        sort: 'last_played' or 'created_at'
+        cursor: next_cursor of the previous page, or None for the first page
+        limit: Page size
+        **filters: Exact matches on class, gender and/or node
+
+    Returns:
+        tuple: (characters, next_cursor); next_cursor is None on the last page
+    """
+    if sort not in CHARACTER_SORT_FIELDS:
+        raise ValueError(f"Cannot sort characters by '{sort}'")
+    index = _character_index()
+    keys = index['sorted'][sort]
+
+    # Intersect the secondary indexes, smallest set first
+    candidates = None
+    for name, value in sorted(filters.items()):
+        if name not in CHARACTER_FILTERS:
+            raise ValueError(f"Cannot filter characters by '{name}'")
+        if value is None or value == '':
+            continue
+        ids = index['by_' + name].get(value, set())
+        candidates = ids if candidates is None else candidates & ids
+
+    after = decode_cursor(cursor) if cursor else None
+    if candidates is not None and len(candidates) * 8 < len(keys):
+        # Selective filter: sort just the matching characters
+        by_id = index['by_id']
+        keys = sorted((_sort_value(by_id[char_id], sort), char_id) for char_id in candidates)
+        candidates = None
+    end = bisect.bisect_left(keys, after) if after else len(keys)
+
+    page = []
+    for position in range(end - 1, -1, -1):
+        char_id = keys[position][1]
+        if candidates is None or char_id in candidates:
+            page.append(index['by_id'][char_id])
+            if len(page) > limit:
+                break
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(_sort_value(page[-1], sort), page[-1]['id'])
+    return page, next_cursor
 
 def get_characters_that_visited_node(node_id):
     """Get characters that visited a specific node"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    char_ids = set(v['character_id'] for v in visits if v['node_id'] == node_id and v['character_id'] is not None)
-    characters = load_json(CHARACTER_FILE, [])
-    return [c for c in characters if c['id'] in char_ids]
+    index = _visits()
+    char_ids = set(v['character_id'] for v in index['by_node'].get(node_id, ()) if v['character_id'] is not None)
+    char_ids |= index['rolled_characters'].get(node_id, set())
+    by_id = _character_index()['by_id']
+    return [by_id[char_id] for char_id in sorted(char_ids) if char_id in by_id]
 
 # Node visit operations
+class TopNodes:
+    """
+    The K most visited nodes, kept up to date one visit at a time
+
+    Visit counts only ever grow, so a node outside the top K can only get in
+    by overtaking the current minimum. That keeps the result exact.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+
+    def increment(self, node_id, count):
+        """Record that node_id now has count visits"""
+        if node_id in self.counts or len(self.counts) < self.size:
+            self.counts[node_id] = count
+            return
+        weakest = min(self.counts, key=self.counts.get)
+        if count > self.counts[weakest]:
+            del self.counts[weakest]
+            self.counts[node_id] = count
+
+    def items(self):
+        """(node_id, count) pairs, most visited first"""
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+
+def migrate_legacy_visits():
+    """
+    Copy visits from the legacy JSON array file into the visit journal
+
+    Runs under the journal lock and publishes the journal with a rename, so
+    workers starting together migrate once and a crash leaves no partial
+    journal behind.
+    """
+    with file_lock(NODE_VISITS_LOG):
+        if os.path.exists(NODE_VISITS_LOG):
+            return
+        visits = load_json(NODE_VISITS_FILE, [])
+        directory = os.path.dirname(NODE_VISITS_LOG) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.node_visits', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for visit in visits:
+                    f.write(json.dumps(visit, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, NODE_VISITS_LOG)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+def iter_node_visits(start=None, end=None):
+    """
+    Stream visits from the journal one at a time
+
+    Args:
+        start: Only visits at or after this datetime
+        end: Only visits before this datetime
+    """
+    if not os.path.exists(NODE_VISITS_LOG):
+        return
+    start = str(start) if start else None
+    end = str(end) if end else None
+    with open(NODE_VISITS_LOG, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # Partial line from a writer that has not finished yet
+                break
+            try:
+                visit = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping corrupt visit record in {NODE_VISITS_LOG}")
+                continue
+            # Timestamps are stored as str(datetime), which sorts chronologically
+            if (start and visit['visited_at'] < start) or (end and visit['visited_at'] >= end):
+                continue
+            yield visit
+
+def load_visit_rollups():
+    """
+    Load the rollups written by compact_node_visits
+
+    Returns:
+        dict: through (raw visits before this time are already rolled up),
+              last_id, node_days ({node_id: {day: count}}) and characters
+              ({character_id: {node_id: {visit_count, first_visit, last_visit}}})
+    """
+    def build(data):
+        return {
+            'through': data.get('through', ''),
+            'last_id': data.get('last_id', 0),
+            'node_days': data.get('node_days', {}),
+            'characters': {int(char_id): nodes for char_id, nodes in data.get('characters', {}).items()}
+        }
+    return load_cached(NODE_VISIT_ROLLUPS_FILE, {}, build)
+
+def _visits():
+    """Return the in-memory visit index, reading only what was appended since last time"""
+    global _visit_index
+    signature = file_signature(NODE_VISITS_LOG)
+    rollup_signature = file_signature(NODE_VISIT_ROLLUPS_FILE)
+    index = _visit_index
+    if (index is None or signature is None or signature[0] != index['inode']
+            or signature[1] < index['offset'] or rollup_signature != index['rollups']):
+        # First use, or the journal was compacted/replaced/truncated: start over
+        rollups = load_visit_rollups()
+        index = _visit_index = {
+            'inode': signature[0] if signature else None,
+            'rollups': rollup_signature,
+            'through': rollups['through'],
+            'offset': 0,
+            'count': 0,
+            'counts': {},
+            'top': TopNodes(TOP_NODES_TRACKED),
+            'visits': [],
+            'by_node': {},
+            'by_character': {},
+            'rolled_characters': {}
+        }
+        # Rolled-up visits count towards the totals; raw visits are added below
+        for node_id, days in rollups['node_days'].items():
+            count = sum(days.values())
+            index['counts'][node_id] = count
+            index['top'].increment(node_id, count)
+            index['count'] += count
+        for char_id, nodes in rollups['characters'].items():
+            for node_id in nodes:
+                index['rolled_characters'].setdefault(node_id, set()).add(char_id)
+    if signature is None or signature[1] == index['offset']:
+        return index
+
+    with open(NODE_VISITS_LOG, 'rb') as f:
+        f.seek(index['offset'])
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            index['offset'] += len(line)
+            try:
+                visit = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping corrupt visit record in {NODE_VISITS_LOG}")
+                continue
+            if visit['visited_at'] < index['through']:
+                # Already in the rollups (compaction stopped before replacing the journal)
+                continue
+            node_id = visit['node_id']
+            count = index['counts'].get(node_id, 0) + 1
+            index['counts'][node_id] = count
+            index['top'].increment(node_id, count)
+            index['count'] += 1
+            index['visits'].append(visit)
+            index['by_node'].setdefault(visit['node_id'], []).append(visit)
+            if visit['character_id'] is not None:
+                index['by_character'].setdefault(visit['character_id'], []).append(visit)
+    return index
+
+def _open_visit_log():
+    """Open the journal for appending and initialize the id counter"""
+    global _visit_log, _visit_lock_file, _visit_pid, _visit_next_id, _visit_last_sync, _visit_unsynced
+    if _visit_pid != os.getpid():
+        # First use, or a forked worker: a child shares its parent's open
+        # lock file, and flock would not keep the two from appending together
+        for inherited in (_visit_log, _visit_lock_file):
+            if inherited is not None:
+                inherited.close()
+        ensure_data_dir()
+        last_id = load_visit_rollups()['last_id']
+        for visit in iter_node_visits():
+            last_id = max(last_id, visit.get('id') or 0)
+        _visit_next_id = last_id + 1
+        _visit_log = open(NODE_VISITS_LOG, 'a', encoding='utf-8')
+        if fcntl is not None:
+            _visit_lock_file = open(NODE_VISITS_LOG + '.lock', 'a')
+        _visit_unsynced = 0
+        _visit_last_sync = time.monotonic()
+        if _visit_pid is None:
+            atexit.register(sync_node_visits)
+        _visit_pid = os.getpid()
+    elif _journal_replaced():
+        # compact_node_visits swapped in a new journal; stop writing to the old one
+        sync_node_visits()
+        _visit_log.close()
+        _visit_log = open(NODE_VISITS_LOG, 'a', encoding='utf-8')
+    return _visit_log
+
+def _last_journal_id():
+    """Id of the last complete line in the journal, or 0 if there is none"""
+    with open(NODE_VISITS_LOG, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        block = 4096
+        while True:
+            start = max(0, end - block)
+            f.seek(start)
+            lines = f.read(end - start).split(b"\n")
+            # The first piece may be a partial line unless we read from the start
+            candidates = lines if start == 0 else lines[1:]
+            for line in reversed(candidates):
+                try:
+                    return json.loads(line).get('id') or 0
+                except ValueError:
+                    continue
+            if start == 0:
+                return 0
+            block *= 2
+
+def _journal_replaced():
+    try:
+        return os.stat(NODE_VISITS_LOG).st_ino != os.fstat(_visit_log.fileno()).st_ino
+    except FileNotFoundError:
+        return True
+
+def sync_node_visits():
+    """Force pending journal writes to disk"""
+    global _visit_unsynced, _visit_last_sync
+    if _visit_log is not None and _visit_unsynced:
+        _visit_log.flush()
+        os.fsync(_visit_log.fileno())
+        _visit_unsynced = 0
+        _visit_last_sync = time.monotonic()
+
 def record_node_visit(node_id, character_id=None):
     """Record a visit to a story node"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    visit = {
-        'id': len(visits) + 1,
-        'node_id': node_id,
-        'character_id': character_id,
-        'visited_at': datetime.utcnow()
-    }
-    visits.append(visit)
-    save_json(NODE_VISITS_FILE, visits)
-    return visit['id']
+    return _append_visits([{'node_id': node_id, 'character_id': character_id}])[0]
+
+def record_node_visits(visits):
+    """
+    Record a batch of visits with a single journal write
+
+    Args:
+        visits: Dicts with node_id, character_id and optionally visited_at
+                (defaults to now)
+
+    Returns:
+        int: Number of visits written
+    """
+    return len(_append_visits(visits)) if visits else 0
+
+def _append_visits(visits):
+    """Append visits to the journal and return their ids"""
+    global _visit_next_id, _visit_log_end, _visit_unsynced
+    with _visit_write_lock:
+        if _visit_pid != os.getpid():
+            _open_visit_log()
+        # The exclusive lock makes id allocation and the append one step
+        # across workers, and keeps compaction from swapping the journal mid-write
+        if _visit_lock_file is not None:
+            fcntl.flock(_visit_lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            log = _open_visit_log()
+            end = os.fstat(log.fileno()).st_size
+            if end != _visit_log_end:
+                # Another worker appended since our last write; continue after its ids
+                last_id = _last_journal_id() or load_visit_rollups()['last_id']
+                _visit_next_id = max(_visit_next_id, last_id + 1)
+            now = datetime.utcnow()
+            ids, lines = [], []
+            for visit in visits:
+                ids.append(_visit_next_id)
+                lines.append(json.dumps({
+                    'id': _visit_next_id,
+                    'node_id': visit['node_id'],
+                    'character_id': visit.get('character_id'),
+                    'visited_at': visit.get('visited_at') or now
+                }, default=str) + "\n")
+                _visit_next_id += 1
+            # One write per batch keeps each line intact under O_APPEND
+            log.write(''.join(lines))
+            log.flush()
+            _visit_log_end = os.fstat(log.fileno()).st_size
+        finally:
+            if _visit_lock_file is not None:
+                fcntl.flock(_visit_lock_file.fileno(), fcntl.LOCK_UN)
+        _visit_unsynced += len(ids)
+        if (_visit_unsynced >= VISIT_FSYNC_EVERY
+                or time.monotonic() - _visit_last_sync >= VISIT_FSYNC_INTERVAL):
+            sync_node_visits()
+    return ids
 
 def get_node_visits(limit=5):
     """Get most recent node visits"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    return sorted(visits, key=lambda x: x['visited_at'], reverse=True)[:limit]
+    return heapq.nlargest(limit, _visits()['visits'], key=lambda x: x['visited_at'])
 
 def get_character_visits(character_id):
     """Get all node visits for a character"""
-    visits = load_json(NODE_VISITS_FILE, [])
-    return [v for v in visits if v['character_id'] == character_id]
+    return list(_visits()['by_character'].get(character_id, ()))
+
+def get_character_visit_summary(character_id):
+    """
+    Get per-node visit totals for a character, rolled-up history included
+
+    Returns:
+        list: Dicts with node_id, visit_count, first_visit and last_visit
+    """
+    summary = {node_id: dict(totals, node_id=node_id)
+               for node_id, totals in load_visit_rollups()['characters'].get(character_id, {}).items()}
+    for visit in get_character_visits(character_id):
+        entry = summary.setdefault(visit['node_id'], {
+            'node_id': visit['node_id'], 'visit_count': 0,
+            'first_visit': visit['visited_at'], 'last_visit': visit['visited_at']
+        })
+        entry['visit_count'] += 1
+        entry['first_visit'] = min(entry['first_visit'], visit['visited_at'])
+        entry['last_visit'] = max(entry['last_visit'], visit['visited_at'])
+    return sorted(summary.values(), key=lambda x: x['last_visit'], reverse=True)
+
+def compact_node_visits(retention_days=VISIT_RETENTION_DAYS, now=None):
+    """
+    Fold raw visits older than the retention window into the rollups
+
+    The rollups are saved before the trimmed journal replaces the old one,
+    and readers ignore raw visits older than the rollups' 'through' time, so
+    a crash between the two steps never counts a visit twice.
+
+    Returns:
+        int: Number of raw visits rolled up
+    """
+    cutoff = str((now or datetime.utcnow()) - timedelta(days=retention_days))
+    ensure_data_dir()
+    with file_lock(NODE_VISITS_LOG):
+        current = load_visit_rollups()
+        if cutoff <= current['through']:
+            return 0
+        rollups = json.loads(json.dumps(current))  # deep copy; the cached dict is shared
+        rolled = 0
+
+        directory = os.path.dirname(NODE_VISITS_LOG) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.node_visits', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as kept:
+                for visit in iter_node_visits():
+                    visited_at = visit['visited_at']
+                    if visited_at < current['through']:
+                        continue
+                    if visited_at >= cutoff:
+                        kept.write(json.dumps(visit) + "\n")
+                        continue
+                    rolled += 1
+                    rollups['last_id'] = max(rollups['last_id'], visit.get('id') or 0)
+                    days = rollups['node_days'].setdefault(visit['node_id'], {})
+                    days[visited_at[:10]] = days.get(visited_at[:10], 0) + 1
+                    if visit['character_id'] is not None:
+                        nodes = rollups['characters'].setdefault(str(visit['character_id']), {})
+                        totals = nodes.setdefault(visit['node_id'], {
+                            'visit_count': 0, 'first_visit': visited_at, 'last_visit': visited_at
+                        })
+                        totals['visit_count'] += 1
+                        totals['first_visit'] = min(totals['first_visit'], visited_at)
+                        totals['last_visit'] = max(totals['last_visit'], visited_at)
+                kept.flush()
+                os.fsync(kept.fileno())
+
+            rollups['through'] = cutoff
+            save_json(NODE_VISIT_ROLLUPS_FILE, rollups)
+            os.replace(tmp_path, NODE_VISITS_LOG)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return rolled
@@ -0,0 +1,37 @@
+"""
+Locking Module - Advisory file locks shared by the storage modules
+
+A lock on path is an flock on the sibling file path + ".lock". flock locks
+belong to the open file, so the same lock also serializes threads of one
+process. Locking is a no-op where fcntl is unavailable (Windows).
+"""
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking becomes a no-op there
+    fcntl = None
+
+@contextmanager
+def file_lock(file_path, shared=False, blocking=True):
+    """
+    Hold an exclusive (or shared) advisory lock for a read-modify-write of file_path
+
+    Raises:
+        BlockingIOError: If blocking is False and another open file holds a conflicting lock
+    """
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(file_path + '.lock', 'a') as lock_file:
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        fcntl.flock(lock_file.fileno(), operation if blocking else operation | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
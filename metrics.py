@@ -0,0 +1,220 @@
+"""
+Metrics Module - Request, render and storage timings in Prometheus text format
+
+Disabled unless METRICS_ENABLED is set. When disabled nothing is hooked or
+wrapped, so the only cost is the import. When enabled:
+
+- every request's latency is observed per endpoint, method and status
+- template render time is observed per template
+- the size of the session cookie sent back is observed
+- every storage backend call is timed and counted, and load_json/save_json
+  also record file sizes
+
+/metrics serves the numbers of the process that answers, so under gunicorn
+each worker reports its own.
+"""
+
+import os
+import time
+import inspect
+import functools
+import threading
+
+ENABLED = os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label set"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in sorted(items):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', repr(float(bound))),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(key)} {series[-1]}")
+        return lines
+
+def _labels(key):
+    if not key:
+        return ""
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for name, value in key)
+    return "{" + ",".join(escaped) + "}"
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency by endpoint", LATENCY_BUCKETS)
+render_latency = Histogram("template_render_duration_seconds", "Template render time", LATENCY_BUCKETS)
+session_cookie_size = Histogram("session_cookie_bytes", "Size of the session cookie sent to the browser", SIZE_BUCKETS)
+storage_latency = Histogram("storage_call_duration_seconds", "Storage backend call time", LATENCY_BUCKETS)
+storage_bytes = Histogram("storage_file_bytes", "Bytes read by load_json and written by save_json", SIZE_BUCKETS)
+
+HISTOGRAMS = (request_latency, render_latency, session_cookie_size, storage_latency, storage_bytes)
+
+# Callables returning extra (name, type, help, [(labels dict, value)]) metrics
+_collectors = []
+
+def register_collector(collector):
+    """Add a callable whose metrics are appended to every /metrics response"""
+    _collectors.append(collector)
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+def _timed(func, name):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            storage_latency.observe(time.perf_counter() - start, call=name)
+    return wrapper
+
+def _timed_generator(func, name):
+    # Time spent producing items, not the consumer's time between them
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        gen = func(*args, **kwargs)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            gen.close()
+            storage_latency.observe(elapsed, call=name)
+    return wrapper
+
+def _timed_file(func, name, size_before):
+    @functools.wraps(func)
+    def wrapper(file_path, *args, **kwargs):
+        # load_json is measured as the file was read, save_json as written
+        size = _file_size(file_path) if size_before else None
+        start = time.perf_counter()
+        try:
+            return func(file_path, *args, **kwargs)
+        finally:
+            storage_latency.observe(time.perf_counter() - start, call=name)
+            if not size_before:
+                size = _file_size(file_path)
+            if size is not None:
+                storage_bytes.observe(size, call=name)
+    return wrapper
+
+def instrument_storage(backend):
+    """
+    Time every public function of a storage backend module
+
+    The module's attributes are replaced, so calls the backend makes to its
+    own functions are measured too. Generator functions such as
+    iter_node_visits are timed over their whole iteration.
+    """
+    for name, value in list(vars(backend).items()):
+        if name.startswith("_") or not callable(value) or isinstance(value, type):
+            continue
+        # Skip imported names and decorated helpers such as the file_lock context manager
+        if getattr(value, "__module__", None) != backend.__name__ or hasattr(value, "__wrapped__"):
+            continue
+        if name == "load_json":
+            setattr(backend, name, _timed_file(value, name, size_before=True))
+        elif name == "save_json":
+            setattr(backend, name, _timed_file(value, name, size_before=False))
+        elif inspect.isgeneratorfunction(value):
+            setattr(backend, name, _timed_generator(value, name))
+        else:
+            setattr(backend, name, _timed(value, name))
+
+def init_app(app, backend=None):
+    """
+    Hook request, render and session cookie timing into a Flask app and add
+    the /metrics endpoint. Does nothing unless metrics are enabled.
+    """
+    if not ENABLED:
+        return
+    from flask import g, request, Response, before_render_template, template_rendered, request_finished
+
+    if backend is not None:
+        instrument_storage(backend)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    # request_finished fires after the session has been saved, so the
+    # session cookie is already on the response
+    def _observe_request(sender, response, **extra):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            request_latency.observe(
+                time.perf_counter() - start,
+                endpoint=request.endpoint or "unknown",
+                method=request.method,
+                status=response.status_code
+            )
+        cookie_name = app.config.get("SESSION_COOKIE_NAME", "session")
+        for header in response.headers.getlist("Set-Cookie"):
+            if header.startswith(cookie_name + "="):
+                session_cookie_size.observe(len(header))
+
+    def _render_started(sender, template, context, **extra):
+        g.setdefault("metrics_renders", []).append(time.perf_counter())
+
+    def _render_finished(sender, template, context, **extra):
+        starts = g.get("metrics_renders")
+        if starts:
+            render_latency.observe(time.perf_counter() - starts.pop(), template=template.name or "string")
+
+    # weak=False: the receivers are local functions with no other reference
+    request_finished.connect(_observe_request, app, weak=False)
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -2,11 +2,21 @@
 Node Map Module - Defines the story structure and nodes
 """
 
+import os
 import random
 import game_data
+import node_store
+from local_database import DATA_DIR
 
-# Define the story nodes
-nodes = {
+# Story nodes are persisted here; admin edits are written back to this file
+NODES_FILE = os.path.join(DATA_DIR, "story_nodes.dat")
+
+# "cache" keeps node text in memory once read; "mmap" keeps only links and
+# type flags resident and decodes text from a shared memory map on each read
+TEXT_MODE = os.environ.get("NODE_TEXT_MODE", "cache")
+
+# Built-in story content, used to seed the node store the first time it is created
+DEFAULT_NODES = {
     "01_001": {
         "title": "O Portal Ancestral",
         "text": """Você é transportado em um redemoinho de luz e cor. Quando a visão retorna, você se encontra em um cenário completamente diferente.""",
@@ -58,86 +68,249 @@ def get_node(node_id):
         "next_node": "01_001"
     })
 
+START_NODE = "01_001"
+
+# Node type filters understood by get_random_node_id
+NODE_TYPES = ("battle", "choice", "orisha")
+
+def node_edges(node):
+    """
+    List the links leaving a node
+    
+    Args:
+        node: Node data dictionary
+        
+    Returns:
+        list: (kind, target_id) tuples, where kind is "", "victory " or "defeat "
+              as used in validation messages
+    """
+    edges = []
+    for choice in node.get('choices', []):
+        for key in ('next_node', 'success_node', 'failure_node'):
+            if key in choice:
+                edges.append(("", choice[key]))
+    if 'next_node' in node:
+        edges.append(("", node['next_node']))
+    if 'victory_node' in node:
+        edges.append(("victory ", node['victory_node']))
+    if 'defeat_node' in node:
+        edges.append(("defeat ", node['defeat_node']))
+    return edges
+
+def node_types(node):
+    """Return the NODE_TYPES a node belongs to"""
+    types = []
+    if "battle" in node:
+        types.append("battle")
+    if "choices" in node:
+        types.append("choice")
+    if node.get("orisha", False):
+        types.append("orisha")
+    return types
+
+class StoryGraph:
+    """
+    Compiled form of the story nodes for fast validation and lookups
+    
+    Node ids are interned to integers. Forward and reverse adjacency lists
+    and per-type node lists are kept up to date one node at a time through
+    set_node/remove_node, and the validation result is cached until the
+    next change.
+    """
+
+    def __init__(self, story_nodes):
+        self.ids = []        # int -> node id
+        self.index = {}      # node id -> int
+        self.present = []    # int -> whether the node exists (or is only referenced)
+        self.forward = []    # int -> list of (target int, kind)
+        self.reverse = []    # int -> list of source ints
+        self.by_type = {node_type: [] for node_type in (None,) + NODE_TYPES}
+        self._positions = {}  # (node type, int) -> position in by_type list
+        self._validation = None
+        for node_id, node in story_nodes.items():
+            self.set_node(node_id, node)
+
+    def intern(self, node_id):
+        """Return the integer id for node_id, allocating one if needed"""
+        i = self.index.get(node_id)
+        if i is None:
+            i = len(self.ids)
+            self.index[node_id] = i
+            self.ids.append(node_id)
+            self.present.append(False)
+            self.forward.append([])
+            self.reverse.append([])
+        return i
+
+    def _add_type(self, node_type, i):
+        members = self.by_type[node_type]
+        self._positions[(node_type, i)] = len(members)
+        members.append(i)
+
+    def _remove_type(self, node_type, i):
+        # Swap with the last member so removal is O(1)
+        members = self.by_type[node_type]
+        position = self._positions.pop((node_type, i))
+        last = members.pop()
+        if last != i:
+            members[position] = last
+            self._positions[(node_type, last)] = position
+
+    def _unlink(self, i):
+        for target, _ in self.forward[i]:
+            self.reverse[target].remove(i)
+        self.forward[i] = []
+        for node_type in (None,) + NODE_TYPES:
+            if (node_type, i) in self._positions:
+                self._remove_type(node_type, i)
+
+    def set_node(self, node_id, node):
+        """Add or replace a node, updating only its own edges"""
+        i = self.intern(node_id)
+        self._unlink(i)
+        self.present[i] = True
+        for kind, target_id in node_edges(node):
+            target = self.intern(target_id)
+            self.forward[i].append((target, kind))
+            self.reverse[target].append(i)
+        self._add_type(None, i)
+        for node_type in node_types(node):
+            self._add_type(node_type, i)
+        self._validation = None
+
+    def remove_node(self, node_id):
+        """Remove a node; links pointing at it become dangling"""
+        i = self.index.get(node_id)
+        if i is None or not self.present[i]:
+            return
+        self._unlink(i)
+        self.present[i] = False
+        self._validation = None
+
+    def has_node(self, node_id):
+        i = self.index.get(node_id)
+        return i is not None and self.present[i]
+
+    def successors(self, node_id):
+        """Node ids this node links to"""
+        i = self.index.get(node_id)
+        return [self.ids[target] for target, _ in self.forward[i]] if i is not None else []
+
+    def predecessors(self, node_id):
+        """Node ids that link to this node"""
+        i = self.index.get(node_id)
+        return [self.ids[source] for source in self.reverse[i]] if i is not None else []
+
+    def random_node_id(self, node_type=None):
+        """Pick a random node id of the given type, or None if there are none"""
+        members = self.by_type.get(node_type)
+        if not members:
+            return None
+        return self.ids[random.choice(members)]
+
+    def validate(self):
+        """
+        Check links and reachability from START_NODE
+        
+        Returns:
+            tuple: (set of reachable ints, list of issue messages)
+        """
+        if self._validation is None:
+            issues = []
+            start = self.intern(START_NODE)
+            reachable = {start}
+            to_visit = [start]
+
+            while to_visit:
+                current = to_visit.pop()
+                if not self.present[current]:
+                    issues.append(f"Node {self.ids[current]} is referenced but doesn't exist")
+                    continue
+                for target, kind in self.forward[current]:
+                    if not self.present[target]:
+                        issues.append(f"Node {self.ids[current]} references non-existent {kind}node {self.ids[target]}")
+                    elif target not in reachable:
+                        reachable.add(target)
+                        to_visit.append(target)
+
+            unreachable = [self.ids[i] for i in self.by_type[None] if i not in reachable]
+            if unreachable:
+                issues.append(f"Unreachable nodes found: {', '.join(unreachable)}")
+            self._validation = (reachable, issues)
+        return self._validation
+
+    def is_reachable(self, node_id):
+        """Whether node_id can be reached from START_NODE"""
+        i = self.index.get(node_id)
+        return i is not None and self.present[i] and i in self.validate()[0]
+
+store = node_store.NodeStore(NODES_FILE, use_mmap=TEXT_MODE == "mmap")
+if not store.exists():
+    store.write(DEFAULT_NODES)
+store.refresh()
+
+# Dict-like view of the story: ids and links are in memory, text is read on demand
+nodes = node_store.StoryNodes(store, cache_text=TEXT_MODE != "mmap")
+
+_graph = None
+
+def get_graph():
+    """Return the compiled story graph, building it on first use"""
+    global _graph
+    if _graph is None:
+        _graph = StoryGraph(nodes.metadata())
+    return _graph
+
+def refresh():
+    """
+    Pick up node edits saved by other workers
+    
+    This is a single stat() call when nothing changed, so it is cheap enough
+    to run on every request.
+    """
+    return _apply_changes(nodes.refresh())
+
+def _apply_changes(changed):
+    """Bring the story graph up to date with nodes changed in the store"""
+    if changed and _graph is not None:
+        for node_id in changed:
+            if node_id in nodes:
+                _graph.set_node(node_id, nodes.store.meta(node_id))
+            else:
+                _graph.remove_node(node_id)
+    return changed
+
+def node_version(node_id):
+    """Generation in which a node was last saved, or None for unknown nodes"""
+    return nodes.version(node_id)
+
+def story_version():
+    """Tag that changes whenever any node is saved, for HTTP ETags"""
+    return store.tag()
+
+def story_last_modified():
+    """Time the story was last saved, or None"""
+    return store.last_modified()
+
+def set_node(node_id, node_data):
+    """Add or replace a story node"""
+    nodes[node_id] = node_data
+    if _graph is not None:
+        _graph.set_node(node_id, node_data)
+
+def delete_node(node_id):
+    """Delete a story node"""
+    del nodes[node_id]
+    if _graph is not None:
+        _graph.remove_node(node_id)
+
 def get_random_node_id(node_type=None):
     """Get a random node ID, optionally of a specific type"""
-    valid_nodes = []
-    for node_id, node_data in nodes.items():
-        if node_type == "battle" and "battle" in node_data:
-            valid_nodes.append(node_id)
-        elif node_type == "choice" and "choices" in node_data:
-            valid_nodes.append(node_id)
-        elif node_type == "orisha" and node_data.get("orisha", False):
-            valid_nodes.append(node_id)
-        elif node_type is None:
-            valid_nodes.append(node_id)
-
-    if valid_nodes:
-        return random.choice(valid_nodes)
-    else:
-        return "01_001"
+    return get_graph().random_node_id(node_type) or "01_001"
 
 def verify_node_connections():
     """Verify all node connections are valid"""
-    issues = []
-    reachable_nodes = set()
-    all_nodes = set(nodes.keys())
-
-    to_visit = ['01_001']
-    reachable_nodes.add('01_001')
-
-    while to_visit:
-        current = to_visit.pop()
-        node = nodes.get(current)
-
-        if not node:
-            issues.append(f"Node {current} is referenced but doesn't exist")
-            continue
-
-        if 'choices' in node:
-            for choice in node['choices']:
-                next_nodes = []
-                if 'next_node' in choice:
-                    next_nodes.append(choice['next_node'])
-                if 'success_node' in choice:
-                    next_nodes.append(choice['success_node'])
-                if 'failure_node' in choice:
-                    next_nodes.append(choice['failure_node'])
-
-                for next_node in next_nodes:
-                    if next_node not in nodes:
-                        issues.append(f"Node {current} references non-existent node {next_node}")
-                    elif next_node not in reachable_nodes:
-                        reachable_nodes.add(next_node)
-                        to_visit.append(next_node)
-
-        if 'next_node' in node:
-            next_node = node['next_node']
-            if next_node not in nodes:
-                issues.append(f"Node {current} references non-existent node {next_node}")
-            elif next_node not in reachable_nodes:
-                reachable_nodes.add(next_node)
-                to_visit.append(next_node)
-
-        if 'victory_node' in node:
-            next_node = node['victory_node']
-            if next_node not in nodes:
-                issues.append(f"Node {current} references non-existent victory node {next_node}")
-            elif next_node not in reachable_nodes:
-                reachable_nodes.add(next_node)
-                to_visit.append(next_node)
-
-        if 'defeat_node' in node:
-            next_node = node['defeat_node']
-            if next_node not in nodes:
-                issues.append(f"Node {current} references non-existent defeat node {next_node}")
-            elif next_node not in reachable_nodes:
-                reachable_nodes.add(next_node)
-                to_visit.append(next_node)
-
-    unreachable = all_nodes - reachable_nodes
-    if unreachable:
-        issues.append(f"Unreachable nodes found: {', '.join(unreachable)}")
-
+    issues = list(get_graph().validate()[1])
     return len(issues) == 0, issues
 
 def count_nodes():
@@ -145,5 +318,11 @@ def count_nodes():
     return len(nodes)
 
 def save_nodes():
-    """Save nodes (in-memory implementation)"""
-    pass
\ No newline at end of file
+    """
+    Write pending node changes to the node store
+
+    Returns:
+        set: Ids of nodes that changed, including edits other workers saved
+             since this process last looked
+    """
+    return _apply_changes(nodes.flush())
\ No newline at end of file
@@ -0,0 +1,402 @@
+"""
+Node Store Module - Persists story nodes in a single indexed file
+
+File layout (all appends, so readers holding old offsets stay valid):
+
+    [title/text bytes ...][index JSON][trailer]
+
+The trailer is a fixed-size struct holding a magic tag, the format version,
+a generation counter and the offset of the index. The index maps each node
+id to its metadata (links, type flags, battle data ...), the offsets of its
+title and text, and the generation it was last written in. Every write
+appends the changed bodies plus a fresh index and trailer; compaction
+rewrites the file once the dead space grows too large.
+"""
+
+import os
+import json
+import mmap
+import struct
+import tempfile
+from datetime import datetime, timezone
+from collections.abc import MutableMapping
+
+from locking import file_lock
+
+MAGIC = b"YRBNODES"
+FORMAT_VERSION = 1
+TRAILER = struct.Struct("<8sIQQ")  # magic, format version, generation, index offset
+
+# Top-level node fields stored as raw text segments instead of in the index
+TEXT_FIELDS = ("title", "text")
+
+# Compact when the file is this many times larger than its live content
+COMPACT_RATIO = 2
+COMPACT_MIN_BYTES = 64 * 1024
+
+# Bytes read at a time when looking for the last intact trailer
+RECOVERY_BLOCK = 64 * 1024
+
+class NodeStore:
+    """
+    Reader/writer for a node store file
+
+    refresh() costs a single os.stat when nothing changed, so it can run on
+    every request to pick up edits made by other workers.
+
+    With use_mmap the file is memory-mapped read-only, so text pages live in
+    the OS page cache shared by every worker instead of in each process heap.
+    """
+
+    def __init__(self, path, use_mmap=False):
+        self.path = path
+        self.use_mmap = use_mmap
+        self.generation = 0
+        self.index = {}
+        self._signature = None
+        self._file = None
+        self._map = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def refresh(self):
+        """
+        Reload the index if the file changed since it was last read
+
+        Returns:
+            set: Ids of nodes added, changed or removed by the reload
+        """
+        signature = self._stat_signature()
+        if signature == self._signature:
+            return set()
+        old_index = self.index
+        self.close()
+        if signature is None:
+            self.generation, self.index = 0, {}
+        else:
+            self._file = open(self.path, "rb")
+            self.generation, self.index, end = _read_index(self._file)
+            signature = (os.fstat(self._file.fileno()).st_ino,) + signature[1:]
+            if self.use_mmap and end:
+                self._map = mmap.mmap(self._file.fileno(), end, access=mmap.ACCESS_READ)
+        self._signature = signature
+        return {node_id for node_id in old_index.keys() | self.index.keys()
+                if old_index.get(node_id, {}).get("v") != self.index.get(node_id, {}).get("v")}
+
+    def close(self):
+        """Release the open file and mapping"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def tag(self):
+        """Opaque string that changes whenever the file is written"""
+        if self._signature is None:
+            return "0"
+        inode, size, _ = self._signature
+        return f"{self.generation}-{inode:x}-{size:x}"
+
+    def last_modified(self):
+        """Modification time of the file as a UTC datetime, or None"""
+        if self._signature is None:
+            return None
+        return datetime.fromtimestamp(self._signature[2] / 1e9, timezone.utc)
+
+    def node_ids(self):
+        return self.index.keys()
+
+    def version(self, node_id):
+        """Generation in which node_id was last written, or None"""
+        entry = self.index.get(node_id)
+        return entry["v"] if entry else None
+
+    def meta(self, node_id):
+        """Node data without its title and text"""
+        return self.index[node_id]["meta"]
+
+    def read_field(self, node_id, field):
+        """Read one text field of a node from disk, or None if the node has none"""
+        span = self.index[node_id].get(field)
+        if span is None:
+            return None
+        offset, length = span
+        if self._map is not None:
+            return self._map[offset:offset + length].decode("utf-8")
+        return os.pread(self._file.fileno(), length, offset).decode("utf-8")
+
+    def read_node(self, node_id):
+        """Return the full node dictionary"""
+        node = dict(self.meta(node_id))
+        for field in TEXT_FIELDS:
+            value = self.read_field(node_id, field)
+            if value is not None:
+                node[field] = value
+        return node
+
+    def write(self, changes):
+        """
+        Persist a batch of node changes
+
+        Args:
+            changes: dict of node_id -> node dict, or None to delete the node
+
+        Returns:
+            set: Ids of nodes that changed since this process last read the
+                 index, including nodes other workers wrote in the meantime
+        """
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with file_lock(self.path):
+            mode = "r+b" if os.path.exists(self.path) else "w+b"
+            with open(self.path, mode) as f:
+                # Re-read under the lock: another worker may have written
+                generation, index, end = _read_index(f)
+                if end < os.fstat(f.fileno()).st_size:
+                    # No write can be in progress while we hold the lock
+                    print(f"Node store {self.path} has a damaged tail, discarding it")
+                generation += 1
+                f.truncate(end)
+                f.seek(end)
+                position = end
+                for node_id, node in changes.items():
+                    if node is None:
+                        index.pop(node_id, None)
+                        continue
+                    entry = {"meta": {k: v for k, v in node.items() if k not in TEXT_FIELDS}, "v": generation}
+                    for field in TEXT_FIELDS:
+                        if node.get(field) is not None:
+                            data = str(node[field]).encode("utf-8")
+                            f.write(data)
+                            entry[field] = [position, len(data)]
+                            position += len(data)
+                    index[node_id] = entry
+                _write_index(f, index, generation, position)
+                size = f.tell()
+
+            live = sum(span[1] for entry in index.values() for span in _spans(entry)) + (size - position)
+            if size > COMPACT_MIN_BYTES and size > COMPACT_RATIO * live:
+                self._compact_locked(generation, index)
+        return self.refresh()
+
+    def compact(self):
+        """
+        Rewrite the file without dead text segments and old indexes
+
+        Returns:
+            set: Ids of nodes other workers changed since this process last read the index
+        """
+        with file_lock(self.path):
+            with open(self.path, "rb") as f:
+                generation, index, _ = _read_index(f)
+            self._compact_locked(generation, index)
+        return self.refresh()
+
+    def _compact_locked(self, generation, index):
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(self.path), suffix=".tmp")
+        try:
+            with open(self.path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                position = 0
+                new_index = {}
+                for node_id, entry in index.items():
+                    entry = dict(entry)
+                    for field in TEXT_FIELDS:
+                        if field in entry:
+                            offset, length = entry[field]
+                            dst.write(os.pread(src.fileno(), length, offset))
+                            entry[field] = [position, length]
+                            position += length
+                    new_index[node_id] = entry
+                _write_index(dst, new_index, generation, position)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+def _spans(entry):
+    return [entry[field] for field in TEXT_FIELDS if field in entry]
+
+def _write_index(f, index, generation, position):
+    data = json.dumps({"nodes": index}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    f.write(data)
+    f.write(TRAILER.pack(MAGIC, FORMAT_VERSION, generation, position))
+    f.flush()
+    os.fsync(f.fileno())
+
+def _parse_trailer(f, trailer_pos):
+    """Return (generation, index) for a trailer at trailer_pos, or None if it isn't valid"""
+    if trailer_pos < 0:
+        return None
+    f.seek(trailer_pos)
+    raw = f.read(TRAILER.size)
+    if len(raw) != TRAILER.size:
+        return None
+    magic, version, generation, index_offset = TRAILER.unpack(raw)
+    if magic != MAGIC or version != FORMAT_VERSION or index_offset > trailer_pos:
+        return None
+    f.seek(index_offset)
+    try:
+        index = json.loads(f.read(trailer_pos - index_offset))["nodes"]
+    except (ValueError, KeyError):
+        return None
+    return generation, index
+
+def _read_index(f):
+    """
+    Read the newest valid index from an open store file
+
+    Returns:
+        tuple: (generation, index, end offset of valid data)
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size == 0:
+        return 0, {}, 0
+    result = _parse_trailer(f, size - TRAILER.size)
+    if result is not None:
+        return result[0], result[1], size
+
+    # Another worker is mid-append, or the last write was interrupted: fall
+    # back to the newest intact trailer, scanning back from the end in blocks
+    end = size
+    while end > 0:
+        start = max(0, end - RECOVERY_BLOCK)
+        f.seek(start)
+        # Overlap the next block so a tag straddling the boundary is found
+        data = f.read(end - start + len(MAGIC) - 1)
+        position = data.rfind(MAGIC)
+        while position >= 0:
+            result = _parse_trailer(f, start + position)
+            if result is not None:
+                return result[0], result[1], start + position + TRAILER.size
+            position = data.rfind(MAGIC, 0, position)
+        end = start
+    return 0, {}, 0
+
+class StoryNodes(MutableMapping):
+    """
+    Dict-like view of a NodeStore
+
+    Node ids and metadata come from the store index; titles and text are read
+    from disk on first access and cached. With cache_text=False nothing is
+    cached and text is decoded on every access, which keeps per-process
+    memory flat for large stories. Assignments and deletions are kept
+    pending until flush().
+    """
+
+    def __init__(self, store, cache_text=True):
+        self.store = store
+        self.cache_text = cache_text
+        self._cache = {}
+        self._pending = {}  # node_id -> node dict, or None for a deletion
+
+    def __getitem__(self, node_id):
+        if node_id in self._pending:
+            node = self._pending[node_id]
+            if node is None:
+                raise KeyError(node_id)
+            return node
+        node = self._cache.get(node_id)
+        if node is None:
+            node = self.store.read_node(node_id)
+            if self.cache_text:
+                self._cache[node_id] = node
+        return node
+
+    def __setitem__(self, node_id, node):
+        self._pending[node_id] = node
+
+    def __delitem__(self, node_id):
+        if node_id not in self:
+            raise KeyError(node_id)
+        self._pending[node_id] = None
+
+    def __contains__(self, node_id):
+        if node_id in self._pending:
+            return self._pending[node_id] is not None
+        return node_id in self.store.index
+
+    def __iter__(self):
+        for node_id in self.store.node_ids():
+            if node_id not in self._pending or self._pending[node_id] is not None:
+                yield node_id
+        for node_id, node in self._pending.items():
+            if node is not None and node_id not in self.store.index:
+                yield node_id
+
+    def __len__(self):
+        count = len(self.store.index)
+        for node_id, node in self._pending.items():
+            if node is None and node_id in self.store.index:
+                count -= 1
+            elif node is not None and node_id not in self.store.index:
+                count += 1
+        return count
+
+    def metadata(self):
+        """Return {node_id: node data without title/text} without reading any text"""
+        meta = {node_id: self.store.meta(node_id) for node_id in self.store.node_ids()}
+        for node_id, node in self._pending.items():
+            if node is None:
+                meta.pop(node_id, None)
+            else:
+                meta[node_id] = node
+        return meta
+
+    def outline(self):
+        """Return {node_id: node data with its title but without its text}"""
+        outline = {}
+        for node_id, meta in self.metadata().items():
+            if node_id in self._pending:
+                node = {k: v for k, v in meta.items() if k != "text"}
+            else:
+                node = dict(meta)
+                title = self.store.read_field(node_id, "title")
+                if title is not None:
+                    node["title"] = title
+            outline[node_id] = node
+        return outline
+
+    def version(self, node_id):
+        """Store generation of the node's last write"""
+        return self.store.version(node_id)
+
+    def flush(self):
+        """
+        Write pending changes to the store
+
+        Returns:
+            set: Ids of nodes that changed, ours and those other workers wrote
+        """
+        if not self._pending:
+            return set()
+        changed = self.store.write(self._pending) | set(self._pending)
+        self._pending = {}
+        for node_id in changed:
+            self._cache.pop(node_id, None)
+        return changed
+
+    def refresh(self):
+        """
+        Pick up changes written by other processes
+
+        Returns:
+            set: Ids of nodes that changed
+        """
+        changed = self.store.refresh()
+        for node_id in changed:
+            self._cache.pop(node_id, None)
+        return changed
@@ -1,8 +1,86 @@
 """
 Player Module - Handles player character creation and attributes
+
+Player uses __slots__, and the progress-tracking containers (choices_made,
+orisha_favor, achievements) are only created once something is recorded, so
+an instance stays small. to_dict/from_dict convert to and from the dict kept
+in the session and in saves, and pack/unpack to a compact binary form.
 """
 
+import json
+import struct
+from operator import attrgetter
+
+# Attribute name -> key in the session/save dict, in packing order
+DICT_KEYS = (
+    ("name", "name"),
+    ("character_class", "class"),
+    ("gender", "gender"),
+    ("mental", "mental"),
+    ("physical", "physical"),
+    ("spiritual", "spiritual"),
+    ("max_health", "max_health"),
+    ("current_health", "current_health"),
+    ("inventory", "inventory"),
+    ("special_abilities", "special_abilities"),
+)
+# Included in to_dict only once they have something in them
+PROGRESS_KEYS = ("choices_made", "orisha_favor", "achievements")
+_KNOWN_KEYS = frozenset(key for _, key in DICT_KEYS) | frozenset(PROGRESS_KEYS)
+
+PACK_VERSION = 2
+_HEADER = struct.Struct("<B5i")  # version, mental, physical, spiritual, max_health, current_health
+_COUNT = struct.Struct("<H")
+_INT = struct.Struct("<i")
+
+def _pack_str(parts, value):
+    data = value.encode("utf-8")
+    parts.append(_COUNT.pack(len(data)))
+    parts.append(data)
+
+def _unpack_str(data, offset):
+    (length,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+def _pack_strs(parts, values):
+    parts.append(_COUNT.pack(len(values)))
+    for value in values:
+        _pack_str(parts, value)
+
+def _unpack_strs(data, offset):
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    values = []
+    for _ in range(count):
+        value, offset = _unpack_str(data, offset)
+        values.append(value)
+    return values, offset
+
+def _pack_counts(parts, mapping):
+    parts.append(_COUNT.pack(len(mapping)))
+    for key, value in mapping.items():
+        _pack_str(parts, key)
+        parts.append(_INT.pack(value))
+
+def _unpack_counts(data, offset):
+    (count,) = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    mapping = {}
+    for _ in range(count):
+        key, offset = _unpack_str(data, offset)
+        (mapping[key],) = _INT.unpack_from(data, offset)
+        offset += _INT.size
+    return mapping, offset
+
 class Player:
+    # extra holds keys of the session dict Player has no field for (such as
+    # a character "id"), so they survive a from_dict/to_dict round trip
+    __slots__ = tuple(attr for attr, _ in DICT_KEYS) + PROGRESS_KEYS + ("extra",)
+
+    _get_fields = attrgetter(*(attr for attr, _ in DICT_KEYS))
+    _keys = tuple(key for _, key in DICT_KEYS)
+
     def __init__(self, name, character_class, gender):
         """
         Initialize a new player character
@@ -45,11 +123,122 @@ class Player:
         self.inventory = []
         self.special_abilities = []
         
-        # Track important choices and progress
-        self.choices_made = {}
-        self.orisha_favor = {}  # Track favor with different Òrìṣà
-        self.achievements = set()
-        
+        # Track important choices and progress; created on first use
+        self.choices_made = None
+        self.orisha_favor = None  # Track favor with different Òrìṣà
+        self.achievements = None
+        self.extra = None
+
+    def to_dict(self):
+        """
+        Convert the player to the dict kept in the session and in saves
+
+        Returns:
+            dict: Player data keyed like the session ("class", not "character_class")
+        """
+        data = dict(zip(self._keys, self._get_fields(self)))
+        data["inventory"] = list(data["inventory"])
+        data["special_abilities"] = list(data["special_abilities"])
+        if self.choices_made:
+            data["choices_made"] = dict(self.choices_made)
+        if self.orisha_favor:
+            data["orisha_favor"] = dict(self.orisha_favor)
+        if self.achievements:
+            data["achievements"] = sorted(self.achievements)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create a player from a session or save dict, without rerolling attributes
+
+        Missing fields get the values a new character of the same name, class
+        and gender would have; keys Player has no field for are kept as is.
+
+        Args:
+            data (dict): Player data as returned by to_dict
+
+        Returns:
+            Player: The player
+        """
+        if all(key in data for key in cls._keys):
+            player = cls.__new__(cls)
+            for attr, key in DICT_KEYS:
+                setattr(player, attr, data[key])
+        else:
+            player = cls(data.get("name", ""), data.get("class", "Arqueólogo"), data.get("gender", "Homem"))
+            for attr, key in DICT_KEYS:
+                if key in data:
+                    setattr(player, attr, data[key])
+        player.inventory = list(player.inventory)
+        player.special_abilities = list(player.special_abilities)
+        player.choices_made = dict(data["choices_made"]) if data.get("choices_made") else None
+        player.orisha_favor = dict(data["orisha_favor"]) if data.get("orisha_favor") else None
+        player.achievements = set(data["achievements"]) if data.get("achievements") else None
+        extra = {key: value for key, value in data.items() if key not in _KNOWN_KEYS}
+        player.extra = extra or None
+        return player
+
+    def pack(self):
+        """
+        Serialize the player to a compact binary form
+
+        Returns:
+            bytes: Data that unpack() turns back into an equal player
+        """
+        parts = [_HEADER.pack(PACK_VERSION, self.mental, self.physical, self.spiritual,
+                              self.max_health, self.current_health)]
+        for value in (self.name, self.character_class, self.gender):
+            _pack_str(parts, value)
+        _pack_strs(parts, self.inventory)
+        _pack_strs(parts, self.special_abilities)
+        _pack_counts(parts, self.choices_made or {})
+        _pack_counts(parts, self.orisha_favor or {})
+        _pack_strs(parts, sorted(self.achievements or ()))
+        _pack_str(parts, json.dumps(self.extra, separators=(",", ":")) if self.extra else "")
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, data):
+        """
+        Create a player from the output of pack()
+
+        Args:
+            data (bytes): Packed player
+
+        Returns:
+            Player: The player
+
+        Raises:
+            ValueError: If the data was packed by an unknown format version
+        """
+        version, mental, physical, spiritual, max_health, current_health = _HEADER.unpack_from(data)
+        if version != PACK_VERSION:
+            raise ValueError(f"Unknown player pack version: {version}")
+        offset = _HEADER.size
+        player = cls.__new__(cls)
+        player.name, offset = _unpack_str(data, offset)
+        player.character_class, offset = _unpack_str(data, offset)
+        player.gender, offset = _unpack_str(data, offset)
+        player.mental = mental
+        player.physical = physical
+        player.spiritual = spiritual
+        player.max_health = max_health
+        player.current_health = current_health
+        player.inventory, offset = _unpack_strs(data, offset)
+        player.special_abilities, offset = _unpack_strs(data, offset)
+        choices_made, offset = _unpack_counts(data, offset)
+        orisha_favor, offset = _unpack_counts(data, offset)
+        achievements, offset = _unpack_strs(data, offset)
+        extra, offset = _unpack_str(data, offset)
+        player.choices_made = choices_made or None
+        player.orisha_favor = orisha_favor or None
+        player.achievements = set(achievements) or None
+        player.extra = json.loads(extra) if extra else None
+        return player
+
     def modify_attribute(self, attribute, amount):
         """
         Modify a player attribute
@@ -156,6 +345,8 @@ class Player:
             node_id (str): The ID of the node where the choice was made
             choice_index (int): The index of the choice made
         """
+        if self.choices_made is None:
+            self.choices_made = {}
         self.choices_made[node_id] = choice_index
     
     def change_orisha_favor(self, orisha, amount):
@@ -166,6 +357,8 @@ class Player:
             orisha (str): The Òrìṣà's name
             amount (int): The amount to change favor by
         """
+        if self.orisha_favor is None:
+            self.orisha_favor = {}
         self.orisha_favor[orisha] = self.orisha_favor.get(orisha, 0) + amount
     
     def get_orisha_favor(self, orisha):
@@ -178,7 +371,7 @@ class Player:
         Returns:
             int: The current favor value
         """
-        return self.orisha_favor.get(orisha, 0)
+        return self.orisha_favor.get(orisha, 0) if self.orisha_favor else 0
     
     def add_achievement(self, achievement):
         """
@@ -187,6 +380,8 @@ class Player:
         Args:
             achievement (str): The achievement to add
         """
+        if self.achievements is None:
+            self.achievements = set()
         self.achievements.add(achievement)
     
     def get_achievement_count(self):
@@ -196,7 +391,7 @@ class Player:
         Returns:
             int: The number of achievements
         """
-        return len(self.achievements)
+        return len(self.achievements) if self.achievements else 0
     
     def get_strength(self, attribute_type="physical"):
         """
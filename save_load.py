@@ -1,152 +1,468 @@
 """
 Save/Load Module - Handles saving and loading game state
+
+Every player has their own saves, in several slots, under a sharded
+directory tree:
+
+    data/saves/<first 2 hex digits of sha1(player_id)>/<player_id>/<slot>.json
+
+so finding a save is a direct path lookup and no directory grows with the
+number of players. Saves are compact JSON written atomically (temp file,
+fsync, rename), so a crash never leaves a half-written save.
+
+A slot is a full snapshot (<slot>.json) plus an append-only log of what
+changed since (<slot>.deltas.jsonl): the node, health, stats, items gained
+and player fields removed. Saving usually appends one short line; loading
+replays the log on top of the snapshot, and the log is folded into a new
+snapshot in the background once it grows long.
+
+Each player directory also holds a small manifest with the name, class,
+save time and turn of every slot, updated on each save, so the load screen
+reads one file instead of replaying every slot.
 """
 
 import os
+import re
+import copy
 import json
 import time
+import secrets
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 from player import Player
+from locking import file_lock
+
+# Define the save directory
+SAVE_DIR = os.environ.get("SAVE_DIR", os.path.join("data", "saves"))
+
+# Slots offered to players; any name matching SLOT_PATTERN is accepted
+SAVE_SLOTS = ("1", "2", "3")
+DEFAULT_SLOT = "1"
+AUTOSAVE_SLOT = "auto"
+SLOT_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+PLAYER_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Delta log settings: compaction starts in the background after COMPACT_AFTER
+# deltas, and a save writes a full snapshot itself if the log reached MAX_DELTAS
+COMPACT_AFTER = int(os.environ.get("SAVE_COMPACT_AFTER", 32))
+MAX_DELTAS = COMPACT_AFTER * 4
+
+# Per-player summary of every slot, so listing saves never opens the slots
+MANIFEST_NAME = ".manifest.json"
+
+# Replayed slot states kept in memory, validated against the files' stat
+STATE_CACHE_SIZE = 1024
+_states = OrderedDict()
+_compacting = set()
+_cache_lock = threading.Lock()
+
+def new_player_id():
+    """Generate an id for a new player"""
+    return secrets.token_hex(16)
+
+def player_dir(player_id):
+    """
+    Directory holding a player's saves
+
+    Raises:
+        ValueError: If the player id is malformed
+    """
+    if not PLAYER_ID_PATTERN.match(player_id or ""):
+        raise ValueError(f"Invalid player id: {player_id!r}")
+    shard = hashlib.sha1(player_id.encode()).hexdigest()[:2]
+    return os.path.join(SAVE_DIR, shard, player_id)
+
+def save_path(player_id, slot=DEFAULT_SLOT):
+    """
+    Path of one save slot
+
+    Raises:
+        ValueError: If the player id or slot is malformed
+    """
+    if not SLOT_PATTERN.match(slot or ""):
+        raise ValueError(f"Invalid save slot: {slot!r}")
+    return os.path.join(player_dir(player_id), f"{slot}.json")
+
+def delta_path(player_id, slot=DEFAULT_SLOT):
+    """Path of the delta log kept next to a save slot's snapshot"""
+    return save_path(player_id, slot)[:-len(".json")] + ".deltas.jsonl"
 
-# Define the save file path
-SAVE_FILE = "yorubaland_save.json"
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _signature(player_id, slot):
+    # Changes whenever the snapshot is replaced or the delta log grows or is truncated
+    snapshot = os.stat(save_path(player_id, slot))
+    try:
+        log = os.stat(delta_path(player_id, slot))
+        log_sig = (log.st_size, log.st_mtime_ns)
+    except FileNotFoundError:
+        log_sig = None
+    return (snapshot.st_ino, snapshot.st_mtime_ns, log_sig)
+
+def _apply_delta(state, delta):
+    player_data = state["player"]
+    player_data.update(delta.get("p", {}))
+    for field in delta.get("p-", ()):
+        player_data.pop(field, None)
+    if "i+" in delta:
+        player_data["inventory"] = player_data["inventory"] + delta["i+"]
+    game_state = state["game_state"]
+    if "n" in delta:
+        game_state["current_node"] = delta["n"]
+    game_state["turn_counter"] = delta["c"]
+    game_state["timestamp"] = delta["t"]
+    state["seq"] = delta["s"]
+
+def _replay(player_id, slot):
+    """Latest snapshot with the delta log applied on top, and the number of deltas"""
+    with open(save_path(player_id, slot), "r", encoding="utf-8") as f:
+        state = json.load(f)
+    state.setdefault("seq", 0)
+    deltas = 0
+    try:
+        with open(delta_path(player_id, slot), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    delta = json.loads(line)
+                except ValueError:
+                    continue  # partial line from a crash mid-append
+                # Deltas already folded into the snapshot are skipped, in case
+                # compaction stopped between writing it and truncating the log
+                if delta["s"] > state["seq"]:
+                    _apply_delta(state, delta)
+                    deltas += 1
+    except FileNotFoundError:
+        pass
+    return state, deltas
+
+def _current_state(player_id, slot):
+    """Replayed state of a slot, from the cache when the files are unchanged"""
+    key = (player_id, slot)
+    signature = _signature(player_id, slot)
+    with _cache_lock:
+        cached = _states.get(key)
+        if cached and cached[0] == signature:
+            _states.move_to_end(key)
+            return cached[1], cached[2]
+    state, deltas = _replay(player_id, slot)
+    _remember(player_id, slot, state, deltas)
+    return state, deltas
+
+def _remember(player_id, slot, state, deltas):
+    key = (player_id, slot)
+    signature = _signature(player_id, slot)
+    with _cache_lock:
+        _states[key] = (signature, state, deltas)
+        _states.move_to_end(key)
+        while len(_states) > STATE_CACHE_SIZE:
+            _states.popitem(last=False)
+
+def _diff(state, player_data, current_node, turn_counter, timestamp):
+    old_player = state["player"]
+    delta = {"s": state["seq"] + 1, "t": timestamp, "c": turn_counter}
+    if current_node != state["game_state"]["current_node"]:
+        delta["n"] = current_node
+    changed = {field: value for field, value in player_data.items()
+               if field != "inventory" and value != old_player.get(field)}
+    old_inventory = old_player.get("inventory", [])
+    new_inventory = player_data["inventory"]
+    if new_inventory[:len(old_inventory)] == old_inventory:
+        if len(new_inventory) > len(old_inventory):
+            delta["i+"] = new_inventory[len(old_inventory):]
+    else:
+        changed["inventory"] = new_inventory
+    if changed:
+        delta["p"] = changed
+    removed = [field for field in old_player if field not in player_data]
+    if removed:
+        delta["p-"] = removed
+    return delta
+
+def _write_snapshot(player_id, slot, state):
+    _write_atomic(save_path(player_id, slot), state)
+    # Every delta is now part of the snapshot
+    with open(delta_path(player_id, slot), "w", encoding="utf-8"):
+        pass
+
+def _compact_in_background(player_id, slot):
+    key = (player_id, slot)
+    with _cache_lock:
+        if key in _compacting:
+            return
+        _compacting.add(key)
+
+    def run():
+        try:
+            compact_save(player_id, slot)
+        finally:
+            with _cache_lock:
+                _compacting.discard(key)
+
+    threading.Thread(target=run, name="save-compaction", daemon=True).start()
+
+def compact_save(player_id, slot=DEFAULT_SLOT):
+    """
+    Fold a slot's delta log into a new snapshot
+
+    Returns:
+        int: Number of deltas folded in
+    """
+    try:
+        path = save_path(player_id, slot)
+        with file_lock(path):
+            state, deltas = _replay(player_id, slot)
+            if deltas:
+                _write_snapshot(player_id, slot, state)
+                _remember(player_id, slot, state, 0)
+            _update_manifest(player_id, slot, _summary(state))
+            return deltas
+    except FileNotFoundError:
+        return 0
+    except Exception as e:
+        print(f"Error compacting save: {e}")
+        return 0
 
-def save_game(player, current_node, turn_counter):
+def save_game(player, current_node, turn_counter, player_id, slot=DEFAULT_SLOT):
     """
-    Save the current game state to a file
-    
+    Save the current game state to a player's slot
+
+    The first save of a slot writes a full snapshot; later saves append only
+    what changed to the slot's delta log, which is folded back into the
+    snapshot in the background once it holds COMPACT_AFTER deltas.
+
     Args:
-        player: Player object
+        player: Player, or a player dict as kept in the session
         current_node: Current story node ID
         turn_counter: Current turn counter
-        
+        player_id: Id of the player the save belongs to
+        slot: Save slot name
+
     Returns:
         bool: True if save was successful, False otherwise
     """
     try:
-        # Create a dictionary with all important game state
-        save_data = {
-            "player": {
-                "name": player["name"],
-                "class": player["class"],
-                "gender": player["gender"],
-                "mental": player["mental"],
-                "physical": player["physical"],
-                "spiritual": player["spiritual"],
-                "max_health": player["max_health"],
-                "current_health": player["current_health"],
-                "inventory": player["inventory"],
-                "special_abilities": player["special_abilities"]
-            },
-            "game_state": {
-                "current_node": current_node,
-                "turn_counter": turn_counter,
-                "timestamp": int(time.time())
-            }
-        }
-        
-        # Write to file
-        with open(SAVE_FILE, 'w') as f:
-            json.dump(save_data, f, indent=2)
-            
+        path = save_path(player_id, slot)
+        if not isinstance(player, Player):
+            player = Player.from_dict(player)
+        player_data = player.to_dict()
+        timestamp = int(time.time())
+        with file_lock(path):
+            try:
+                state, deltas = _current_state(player_id, slot)
+            except FileNotFoundError:
+                state = None
+
+            if state is None or deltas >= MAX_DELTAS:
+                # Create a dictionary with all important game state
+                state = {
+                    "player": player_data,
+                    "game_state": {
+                        "current_node": current_node,
+                        "turn_counter": turn_counter,
+                        "timestamp": timestamp
+                    },
+                    "seq": state["seq"] if state else 0
+                }
+                _write_snapshot(player_id, slot, copy.deepcopy(state))
+                deltas = 0
+            else:
+                delta = _diff(state, player_data, current_node, turn_counter, timestamp)
+                line = (json.dumps(delta, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+                with open(delta_path(player_id, slot), "ab+") as f:
+                    # Start on a fresh line if a crash left a partial one behind
+                    if f.tell():
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            line = b"\n" + line
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                state = copy.deepcopy(state)
+                _apply_delta(state, delta)
+                deltas += 1
+            _remember(player_id, slot, state, deltas)
+            # Still under the slot lock, so a slower concurrent save of this
+            # slot can't overwrite the entry with an older summary
+            _update_manifest(player_id, slot, _summary(state))
+
+        if deltas >= COMPACT_AFTER:
+            _compact_in_background(player_id, slot)
         return True
-    
+
     except Exception as e:
         print(f"Error saving game: {e}")
         return False
 
-def load_game():
+def load_game(player_id, slot=DEFAULT_SLOT):
     """
-    Load a game from the save file
-    
+    Load a game from one of a player's slots
+
     Returns:
         dict: Dictionary containing player data and game state
     """
     try:
-        # Check if save file exists
-        if not os.path.exists(SAVE_FILE):
-            return None
-        
-        # Read save file
-        with open(SAVE_FILE, 'r') as f:
-            save_data = json.load(f)
-        
+        with file_lock(save_path(player_id, slot), shared=True):
+            save_data, _ = _current_state(player_id, slot)
+
         # Extract player data and game state
         player_data = save_data["player"]
         game_state = save_data["game_state"]
-        
+
         # Return the data as a dictionary
         return {
-            "player": {
-                "name": player_data["name"],
-                "class": player_data["class"],
-                "gender": player_data["gender"],
-                "mental": player_data["mental"],
-                "physical": player_data["physical"],
-                "spiritual": player_data["spiritual"],
-                "max_health": player_data["max_health"],
-                "current_health": player_data["current_health"],
-                "inventory": player_data["inventory"],
-                "special_abilities": player_data["special_abilities"]
-            },
+            "player": copy.deepcopy(player_data),
             "current_node": game_state["current_node"],
             "turn_counter": game_state["turn_counter"]
         }
-    
+
+    except FileNotFoundError:
+        return None
     except Exception as e:
         print(f"Error loading game: {e}")
         return None
 
-def save_exists():
+def save_exists(player_id, slot=DEFAULT_SLOT):
     """
-    Check if a save file exists
-    
+    Check if a save slot exists
+
     Returns:
-        bool: True if a save file exists, False otherwise
+        bool: True if the slot has a save, False otherwise
     """
-    return os.path.exists(SAVE_FILE)
+    try:
+        return os.path.exists(save_path(player_id, slot))
+    except ValueError:
+        return False
+
+def manifest_path(player_id):
+    """Path of the manifest summarizing all of a player's slots"""
+    return os.path.join(player_dir(player_id), MANIFEST_NAME)
+
+def _summary(state):
+    player_data = state["player"]
+    game_state = state["game_state"]
+    return {
+        "player_name": player_data["name"],
+        "player_class": player_data["class"],
+        "player_gender": player_data["gender"],
+        "timestamp": game_state["timestamp"],
+        "turn_counter": game_state["turn_counter"]
+    }
+
+def _scan_slots(player_id):
+    summaries = {}
+    try:
+        names = os.listdir(player_dir(player_id))
+    except FileNotFoundError:
+        return summaries
+    for name in names:
+        slot, ext = os.path.splitext(name)
+        if ext == ".json" and SLOT_PATTERN.match(slot):
+            try:
+                # Called with the manifest locked: don't wait on a slot another
+                # writer holds, since that writer updates its own entry next
+                with file_lock(save_path(player_id, slot), shared=True, blocking=False):
+                    state, _ = _current_state(player_id, slot)
+                summaries[slot] = _summary(state)
+            except (OSError, ValueError, KeyError):
+                continue
+    return summaries
 
-def get_save_info():
+def _read_manifest(player_id):
+    """Slot summaries of a player, rebuilt from the slots if the manifest is missing or damaged"""
+    path = manifest_path(player_id)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        if not os.path.isdir(os.path.dirname(path)):
+            return {}
+    except ValueError:
+        pass
+    with file_lock(path):
+        manifest = _scan_slots(player_id)
+        _write_atomic(path, manifest)
+    return manifest
+
+def _update_manifest(player_id, slot, summary):
+    """Set (or with summary None, remove) one slot's entry in the manifest"""
+    path = manifest_path(player_id)
+    with file_lock(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifest = _scan_slots(player_id)
+        if summary is None:
+            manifest.pop(slot, None)
+        else:
+            manifest[slot] = summary
+        _write_atomic(path, manifest)
+
+def _save_info(slot, summary):
+    # Format timestamp
+    time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(summary["timestamp"]))
+    return dict(summary, slot=slot, save_time=time_str)
+
+def get_save_info(player_id, slot=DEFAULT_SLOT):
     """
-    Get information about the existing save
-    
+    Get information about a saved slot, from the player's manifest
+
     Returns:
         dict: Save information or None if no save exists
     """
-    if not save_exists():
-        return None
-    
     try:
-        with open(SAVE_FILE, 'r') as f:
-            save_data = json.load(f)
-        
-        player_data = save_data["player"]
-        game_state = save_data["game_state"]
-        
-        # Format timestamp
-        timestamp = game_state["timestamp"]
-        time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
-        
-        return {
-            "player_name": player_data["name"],
-            "player_class": player_data["class"],
-            "player_gender": player_data["gender"],
-            "save_time": time_str,
-            "turn_counter": game_state["turn_counter"]
-        }
-    
+        summary = _read_manifest(player_id).get(slot)
+        return _save_info(slot, summary) if summary else None
     except Exception:
         return None
 
-def delete_save():
+def list_saves(player_id):
     """
-    Delete the save file
-    
+    Get information about all of a player's saves, reading only the manifest
+
+    Returns:
+        list: Save information dictionaries, most recent first
+    """
+    try:
+        manifest = _read_manifest(player_id)
+    except Exception:
+        return []
+    saves = [_save_info(slot, summary) for slot, summary in manifest.items()]
+    return sorted(saves, key=lambda x: x["timestamp"], reverse=True)
+
+def delete_save(player_id, slot=DEFAULT_SLOT):
+    """
+    Delete a save slot
+
     Returns:
         bool: True if deletion was successful, False otherwise
     """
     try:
-        if os.path.exists(SAVE_FILE):
-            os.remove(SAVE_FILE)
+        path = save_path(player_id, slot)
+        with file_lock(path):
+            for file_path in (path, delta_path(player_id, slot)):
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+            with _cache_lock:
+                _states.pop((player_id, slot), None)
+            _update_manifest(player_id, slot, None)
         return True
     except Exception:
         return False
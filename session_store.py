@@ -0,0 +1,225 @@
+"""
+Session Store Module - Server-side Flask sessions
+
+The browser only keeps a signed session id; the session data lives in a
+store on the server. Two stores are available:
+
+- MemorySessionStore: LRU dictionary, for a single process
+- SQLiteSessionStore: shared SQLite file, for several gunicorn workers
+
+Both expire sessions after a TTL.
+"""
+
+import os
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+DEFAULT_TTL = 24 * 60 * 60
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dictionary identified by a server-side id"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session data to a fresh id; the old id stops working"""
+        if self.previous_sid is None and not self.new:
+            self.previous_sid = self.sid
+        self.sid = secrets.token_urlsafe(24)
+        self.new = True
+        self.modified = True
+
+class MemorySessionStore:
+    """In-process LRU session store with TTL expiry"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # sid -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return entry[1]
+
+    def set(self, sid, payload, ttl):
+        now = time.time()
+        with self._lock:
+            self._data[sid] = (now + ttl, payload)
+            self._data.move_to_end(sid)
+            # Evict expired sessions from the cold end, then enforce the size cap
+            while self._data:
+                oldest_sid, (expires_at, _) = next(iter(self._data.items()))
+                if expires_at >= now and len(self._data) <= self.max_entries:
+                    break
+                del self._data[oldest_sid]
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+class SQLiteSessionStore:
+    """Session store in a SQLite file shared by all worker processes"""
+
+    # Purge expired rows once every this many writes
+    PURGE_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "sid TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions(expires_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._connection().execute(
+            "SELECT payload FROM sessions WHERE sid = ? AND expires_at >= ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, payload, ttl):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                "INSERT INTO sessions (sid, payload, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(sid) DO UPDATE SET payload = excluded.payload, expires_at = excluded.expires_at",
+                (sid, payload, now + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+
+    def delete(self, sid):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface that keeps session data in a store"""
+
+    serializer = session_json_serializer
+    session_class = ServerSideSession
+    salt = "server-side-session"
+
+    def __init__(self, store, ttl=DEFAULT_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                payload = self.store.get(sid)
+                if payload is not None:
+                    try:
+                        return self.session_class(self.serializer.loads(payload), sid=sid)
+                    except ValueError:
+                        pass
+        return self.session_class(sid=secrets.token_urlsafe(24), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified or session.new:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), self.ttl)
+
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+            response.vary.add("Cookie")
+
+def regenerate(session):
+    """
+    Give the session a new id, e.g. on login and logout, against session fixation
+
+    Does nothing for Flask's cookie sessions, which have no id to steal.
+    """
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
+
+def init_app(app, backend="sqlite", path=None, ttl=DEFAULT_TTL):
+    """
+    Install a server-side session interface on the app
+
+    Args:
+        app: Flask application
+        backend: "memory", "sqlite", or "cookie" to keep Flask's signed-cookie sessions
+        path: SQLite file for the "sqlite" backend
+        ttl: Session lifetime in seconds
+    """
+    if backend == "cookie":
+        return
+    if backend == "memory":
+        store = MemorySessionStore()
+    elif backend == "sqlite":
+        store = SQLiteSessionStore(path or os.path.join("data", "sessions.sqlite3"))
+    else:
+        raise ValueError(f"Unknown session backend '{backend}'")
+    app.session_interface = ServerSideSessionInterface(store, ttl)
@@ -0,0 +1,464 @@
+"""
+SQLite Database Module - Implements the local_database API on top of SQLite
+
+The schema mirrors the SQLAlchemy models in database_config.py, with indexes
+on the columns the admin pages filter and sort by, plus an "extra" JSON column
+on characters for fields that have no column of their own, so characters
+round-trip the same way they do in the JSON backend. The database runs in WAL
+mode so gunicorn workers can read while another worker writes.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from local_database import Admin, DATA_DIR, VISIT_RETENTION_DAYS, CHARACTER_SORT_FIELDS, CHARACTER_FILTERS, encode_cursor, decode_cursor
+
+DATABASE_FILE = os.environ.get("SQLITE_PATH", os.path.join(DATA_DIR, "rpg.sqlite3"))
+
+DEFAULT_ADMIN_HASH = "pbkdf2:sha256:600000$X5ksUUrEU8aAUh70$694f77f42c0caddb094cd49b3bf72bc75e0eda9f2d67f417f318afbf8c91daad"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS admins (
+    id INTEGER PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT,
+    last_login TEXT
+);
+CREATE TABLE IF NOT EXISTS "character" (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    character_class TEXT,
+    gender TEXT,
+    mental INTEGER DEFAULT 10,
+    physical INTEGER DEFAULT 10,
+    spiritual INTEGER DEFAULT 10,
+    max_health INTEGER DEFAULT 100,
+    current_health INTEGER DEFAULT 100,
+    inventory TEXT,
+    special_abilities TEXT,
+    current_node TEXT DEFAULT 'start',
+    created_at TEXT,
+    last_played TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS node_visit (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    character_id INTEGER REFERENCES "character"(id),
+    visited_at TEXT
+);
+CREATE TABLE IF NOT EXISTS node_visit_count (
+    node_id TEXT PRIMARY KEY,
+    visit_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS node_visit_daily (
+    node_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    visit_count INTEGER NOT NULL,
+    PRIMARY KEY (node_id, day)
+);
+CREATE TABLE IF NOT EXISTS character_node_visit (
+    character_id INTEGER NOT NULL,
+    node_id TEXT NOT NULL,
+    visit_count INTEGER NOT NULL,
+    first_visit TEXT,
+    last_visit TEXT,
+    PRIMARY KEY (character_id, node_id)
+);
+CREATE INDEX IF NOT EXISTS ix_character_node_visit_node_id ON character_node_visit(node_id);
+CREATE INDEX IF NOT EXISTS ix_node_visit_count_visit_count ON node_visit_count(visit_count);
+CREATE INDEX IF NOT EXISTS ix_node_visit_node_id ON node_visit(node_id);
+CREATE INDEX IF NOT EXISTS ix_node_visit_character_id ON node_visit(character_id);
+CREATE INDEX IF NOT EXISTS ix_node_visit_visited_at ON node_visit(visited_at);
+CREATE INDEX IF NOT EXISTS ix_character_last_played ON "character"(last_played);
+CREATE INDEX IF NOT EXISTS ix_character_created_at ON "character"(created_at);
+CREATE INDEX IF NOT EXISTS ix_character_class_last_played ON "character"(character_class, last_played);
+CREATE INDEX IF NOT EXISTS ix_character_gender_last_played ON "character"(gender, last_played);
+CREATE INDEX IF NOT EXISTS ix_character_current_node_last_played ON "character"(current_node, last_played);
+"""
+
+# Columns that can be written through create_character/update_character
+CHARACTER_COLUMNS = (
+    'name', 'character_class', 'gender', 'mental', 'physical', 'spiritual',
+    'max_health', 'current_health', 'inventory', 'special_abilities', 'current_node'
+)
+# Set by the database itself; any other key goes to the extra column
+CHARACTER_MANAGED = ('id', 'created_at', 'last_played', 'extra')
+
+_local = threading.local()
+
+def get_connection():
+    """Get this thread's connection, reconnecting after a fork"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        directory = os.path.dirname(DATABASE_FILE)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+def _now():
+    return datetime.utcnow().isoformat(sep=' ')
+
+def _parse_time(value):
+    if not value:
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
+
+def _character_row(data):
+    """
+    Map a character dict (session or model style) to column values
+
+    Returns:
+        tuple: (row, extra); extra holds the keys that have no column
+    """
+    data = dict(data)
+    if 'class' in data and 'character_class' not in data:
+        data['character_class'] = data.pop('class')
+    row = {}
+    for column in CHARACTER_COLUMNS:
+        if column in data:
+            value = data.pop(column)
+            if column in ('inventory', 'special_abilities') and not isinstance(value, str) and value is not None:
+                value = json.dumps(value)
+            row[column] = value
+    extra = {key: value for key, value in data.items() if key not in CHARACTER_MANAGED}
+    return row, extra
+
+def _character_dict(row):
+    character = dict(row)
+    extra = character.pop('extra', None)
+    if extra:
+        for key, value in json.loads(extra).items():
+            character.setdefault(key, value)
+    character['created_at'] = _parse_time(character['created_at'])
+    character['last_played'] = _parse_time(character['last_played'])
+    return character
+
+def _visit_dict(row):
+    visit = dict(row)
+    visit['visited_at'] = _parse_time(visit['visited_at'])
+    return visit
+
+def ensure_data_dir():
+    """Create the schema and the default admin if needed"""
+    conn = get_connection()
+    with conn:
+        conn.executescript(SCHEMA)
+        # Databases created before characters had an extra column
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info("character")')}
+        if 'extra' not in columns:
+            conn.execute('ALTER TABLE "character" ADD COLUMN extra TEXT')
+        conn.execute(
+            "INSERT OR IGNORE INTO admins (username, password_hash, created_at) VALUES (?, ?, ?)",
+            ('admin', DEFAULT_ADMIN_HASH, _now())
+        )
+        # Backfill the counters for databases created before they existed
+        if conn.execute("SELECT 1 FROM node_visit_count LIMIT 1").fetchone() is None:
+            conn.execute(
+                "INSERT INTO node_visit_count (node_id, visit_count) "
+                "SELECT node_id, COUNT(*) FROM node_visit GROUP BY node_id"
+            )
+
+# Admin operations
+def create_admin(admin_data):
+    """Create a new admin"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO admins (username, password_hash, created_at) VALUES (?, ?, ?)",
+            (admin_data['username'], admin_data['password_hash'], _now())
+        )
+    return cursor.rowcount == 1
+
+def get_admin(username):
+    """Get admin by username"""
+    row = get_connection().execute(
+        "SELECT username, password_hash, created_at, last_login FROM admins WHERE username = ?", (username,)
+    ).fetchone()
+    return dict(row) if row else None
+
+def get_admin_by_username(username):
+    """Get admin by username"""
+    admin_data = get_admin(username)
+    if admin_data:
+        return Admin(**admin_data)
+    return None
+
+def update_admin_login(username):
+    """Update admin's last login"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("UPDATE admins SET last_login = ? WHERE username = ?", (_now(), username))
+    return cursor.rowcount == 1
+
+# Character operations
+def create_character(data):
+    """Create a new character"""
+    row, extra = _character_row(data)
+    row['created_at'] = row['last_played'] = _now()
+    if extra:
+        row['extra'] = json.dumps(extra, default=str)
+    columns = ', '.join(row)
+    placeholders = ', '.join('?' for _ in row)
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(f'INSERT INTO "character" ({columns}) VALUES ({placeholders})', list(row.values()))
+    return cursor.lastrowid
+
+def get_character(char_id):
+    """Get character by ID"""
+    row = get_connection().execute('SELECT * FROM "character" WHERE id = ?', (char_id,)).fetchone()
+    return _character_dict(row) if row else None
+
+def update_character(char_id, data):
+    """Update character data"""
+    row, extra = _character_row(data)
+    row['last_played'] = _now()
+    assignments = [f"{column} = ?" for column in row]
+    params = list(row.values())
+    if extra:
+        # Merge into the stored extra fields in the same statement, like
+        # the JSON backend's dict.update
+        paths = ', '.join('?, json(?)' for _ in extra)
+        assignments.append(f"extra = json_set(COALESCE(extra, '{{}}'), {paths})")
+        for key, value in extra.items():
+            params += ['$."' + key + '"', json.dumps(value, default=str)]
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(f'UPDATE "character" SET {", ".join(assignments)} WHERE id = ?', params + [char_id])
+    return cursor.rowcount == 1
+
+def get_all_characters():
+    """Get all characters"""
+    rows = get_connection().execute('SELECT * FROM "character" ORDER BY last_played DESC').fetchall()
+    return [_character_dict(row) for row in rows]
+
+def iter_characters():
+    """Stream all characters in id order without loading them all at once"""
+    cursor = get_connection().execute('SELECT * FROM "character" ORDER BY id')
+    for rows in iter(lambda: cursor.fetchmany(500), []):
+        for row in rows:
+            yield _character_dict(row)
+
+def count_characters():
+    """Count total number of characters"""
+    return get_connection().execute('SELECT COUNT(*) FROM "character"').fetchone()[0]
+
+def get_recent_characters(limit=5):
+    """Get most recently created characters"""
+    rows = get_connection().execute(
+        'SELECT * FROM "character" ORDER BY created_at DESC LIMIT ?', (limit,)
+    ).fetchall()
+    return [_character_dict(row) for row in rows]
+
+def list_characters(sort='last_played', cursor=None, limit=50, **filters):
+    """
+    Get one page of characters, newest first, using keyset pagination
+
+    Args:
+        sort: 'last_played' or 'created_at'
+        cursor: next_cursor of the previous page, or None for the first page
+        limit: Page size
+        **filters: Exact matches on class, gender and/or node
+
+    Returns:
+        tuple: (characters, next_cursor); next_cursor is None on the last page
+    """
+    if sort not in CHARACTER_SORT_FIELDS:
+        raise ValueError(f"Cannot sort characters by '{sort}'")
+    conditions, params = [], []
+    for name, value in sorted(filters.items()):
+        if name not in CHARACTER_FILTERS:
+            raise ValueError(f"Cannot filter characters by '{name}'")
+        if value is None or value == '':
+            continue
+        conditions.append(f"{CHARACTER_FILTERS[name]} = ?")
+        params.append(value)
+    after = decode_cursor(cursor) if cursor else None
+    if after:
+        conditions.append(f"({sort}, id) < (?, ?)")
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = get_connection().execute(
+        f'SELECT * FROM "character" {where} ORDER BY {sort} DESC, id DESC LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort] or '', rows[-1]['id'])
+    return [_character_dict(row) for row in rows], next_cursor
+
+def get_characters_that_visited_node(node_id):
+    """Get characters that visited a specific node"""
+    rows = get_connection().execute(
+        'SELECT * FROM "character" WHERE id IN '
+        '(SELECT character_id FROM node_visit WHERE node_id = ? AND character_id IS NOT NULL '
+        'UNION SELECT character_id FROM character_node_visit WHERE node_id = ?) '
+        'ORDER BY id', (node_id, node_id)
+    ).fetchall()
+    return [_character_dict(row) for row in rows]
+
+# Node visit operations
+# Visit counts are read from node_visit_count, which record_node_visit keeps
+# up to date in the same transaction as the raw insert. compact_node_visits
+# only moves raw rows into rollups, so the counters stay exact.
+def count_node_visits():
+    """Count total number of node visits"""
+    return get_connection().execute("SELECT COALESCE(SUM(visit_count), 0) FROM node_visit_count").fetchone()[0]
+
+def count_node_visits_for_node(node_id):
+    """Count visits for a specific node"""
+    row = get_connection().execute(
+        "SELECT visit_count FROM node_visit_count WHERE node_id = ?", (node_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def get_top_visited_nodes(limit=5):
+    """Get most visited nodes"""
+    rows = get_connection().execute(
+        "SELECT node_id, visit_count FROM node_visit_count ORDER BY visit_count DESC LIMIT ?", (limit,)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def record_node_visit(node_id, character_id=None):
+    """Record a visit to a story node"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute(
+            "INSERT INTO node_visit (node_id, character_id, visited_at) VALUES (?, ?, ?)",
+            (node_id, character_id, _now())
+        )
+        conn.execute(
+            "INSERT INTO node_visit_count (node_id, visit_count) VALUES (?, 1) "
+            "ON CONFLICT(node_id) DO UPDATE SET visit_count = visit_count + 1",
+            (node_id,)
+        )
+    return cursor.lastrowid
+
+def record_node_visits(visits):
+    """
+    Record a batch of visits in one transaction
+
+    Args:
+        visits: Dicts with node_id, character_id and optionally visited_at
+                (defaults to now)
+
+    Returns:
+        int: Number of visits written
+    """
+    if not visits:
+        return 0
+    now = _now()
+    rows = [(visit['node_id'], visit.get('character_id'), str(visit.get('visited_at') or now)) for visit in visits]
+    counts = {}
+    for node_id, _, _ in rows:
+        counts[node_id] = counts.get(node_id, 0) + 1
+    conn = get_connection()
+    with conn:
+        conn.executemany("INSERT INTO node_visit (node_id, character_id, visited_at) VALUES (?, ?, ?)", rows)
+        conn.executemany(
+            "INSERT INTO node_visit_count (node_id, visit_count) VALUES (?, ?) "
+            "ON CONFLICT(node_id) DO UPDATE SET visit_count = visit_count + excluded.visit_count",
+            counts.items()
+        )
+    return len(rows)
+
+def iter_node_visits(start=None, end=None):
+    """
+    Stream visits in time order without loading them all at once
+
+    Args:
+        start: Only visits at or after this datetime
+        end: Only visits before this datetime
+    """
+    conditions, params = [], []
+    if start:
+        conditions.append("visited_at >= ?")
+        params.append(str(start))
+    if end:
+        conditions.append("visited_at < ?")
+        params.append(str(end))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # Ordering by the indexed column avoids a temporary sort of the whole range
+    cursor = get_connection().execute(f"SELECT * FROM node_visit {where} ORDER BY visited_at", params)
+    for rows in iter(lambda: cursor.fetchmany(500), []):
+        for row in rows:
+            yield _visit_dict(row)
+
+def get_node_visits(limit=5):
+    """Get most recent node visits"""
+    rows = get_connection().execute(
+        "SELECT * FROM node_visit ORDER BY visited_at DESC LIMIT ?", (limit,)
+    ).fetchall()
+    return [_visit_dict(row) for row in rows]
+
+def get_character_visits(character_id):
+    """Get all node visits for a character"""
+    rows = get_connection().execute(
+        "SELECT * FROM node_visit WHERE character_id = ? ORDER BY visited_at DESC", (character_id,)
+    ).fetchall()
+    return [_visit_dict(row) for row in rows]
+
+def get_character_visit_summary(character_id):
+    """
+    Get per-node visit totals for a character, rolled-up history included
+
+    Returns:
+        list: Dicts with node_id, visit_count, first_visit and last_visit
+    """
+    rows = get_connection().execute(
+        "SELECT node_id, SUM(visit_count) AS visit_count, MIN(first_visit) AS first_visit, "
+        "MAX(last_visit) AS last_visit FROM ("
+        "  SELECT node_id, visit_count, first_visit, last_visit FROM character_node_visit WHERE character_id = ?"
+        "  UNION ALL"
+        "  SELECT node_id, COUNT(*), MIN(visited_at), MAX(visited_at) FROM node_visit WHERE character_id = ? GROUP BY node_id"
+        ") GROUP BY node_id ORDER BY last_visit DESC", (character_id, character_id)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def compact_node_visits(retention_days=VISIT_RETENTION_DAYS, now=None):
+    """
+    Fold raw visits older than the retention window into the rollup tables
+
+    Returns:
+        int: Number of raw visits rolled up
+    """
+    cutoff = str((now or datetime.utcnow()) - timedelta(days=retention_days))
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO node_visit_daily (node_id, day, visit_count) "
+            "SELECT node_id, substr(visited_at, 1, 10), COUNT(*) FROM node_visit "
+            "WHERE visited_at < ? GROUP BY node_id, substr(visited_at, 1, 10) "
+            "ON CONFLICT(node_id, day) DO UPDATE SET visit_count = visit_count + excluded.visit_count",
+            (cutoff,)
+        )
+        conn.execute(
+            "INSERT INTO character_node_visit (character_id, node_id, visit_count, first_visit, last_visit) "
+            "SELECT character_id, node_id, COUNT(*), MIN(visited_at), MAX(visited_at) FROM node_visit "
+            "WHERE visited_at < ? AND character_id IS NOT NULL GROUP BY character_id, node_id "
+            "ON CONFLICT(character_id, node_id) DO UPDATE SET "
+            "visit_count = visit_count + excluded.visit_count, "
+            "first_visit = MIN(first_visit, excluded.first_visit), "
+            "last_visit = MAX(last_visit, excluded.last_visit)",
+            (cutoff,)
+        )
+        cursor = conn.execute("DELETE FROM node_visit WHERE visited_at < ?", (cutoff,))
+    return cursor.rowcount
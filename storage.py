@@ -0,0 +1,23 @@
+"""
+Storage Module - Selects the storage backend used by the web application
+
+Backends are modules exposing the same functions as local_database. The
+backend is picked with the STORAGE_BACKEND environment variable.
+"""
+
+import os
+import importlib
+
+BACKENDS = {
+    "json": "local_database",
+    "sqlite": "sqlite_database"
+}
+
+DEFAULT_BACKEND = "json"
+
+def get_backend(name=None):
+    """Import and return the storage backend module"""
+    name = name or os.environ.get("STORAGE_BACKEND", DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return importlib.import_module(BACKENDS[name])
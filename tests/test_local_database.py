@@ -0,0 +1,162 @@
+"""
+Tests for the JSON file storage backend
+"""
+
+import json
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+
+import local_database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """local_database working in an empty data directory"""
+    monkeypatch.chdir(tmp_path)
+    # Forget the journal another test's data directory was opened for
+    for name in ("_visit_log", "_visit_lock_file", "_visit_pid", "_visit_next_id", "_visit_log_end", "_visit_index"):
+        monkeypatch.setattr(local_database, name, None)
+    local_database.invalidate_cache()
+    local_database.ensure_data_dir()
+    yield local_database
+    local_database.flush_pending_writes()
+    local_database.sync_node_visits()
+    for name in ("_visit_log", "_visit_lock_file"):
+        if getattr(local_database, name) is not None:
+            getattr(local_database, name).close()
+    local_database.invalidate_cache()
+
+
+def count_saves(db, monkeypatch):
+    saves = []
+    save_json = db.save_json
+
+    def counting_save_json(file_path, data):
+        if file_path == db.CHARACTER_FILE:
+            saves.append(file_path)
+        return save_json(file_path, data)
+
+    monkeypatch.setattr(db, "save_json", counting_save_json)
+    return saves
+
+
+def test_updates_to_different_characters_are_coalesced(db, monkeypatch):
+    ids = [db.create_character({"name": f"P{i}", "character_class": "Cientista", "gender": "Mulher"})
+           for i in range(5)]
+    saves = count_saves(db, monkeypatch)
+
+    # Interleave characters so each update follows one for another character
+    for turn in range(3):
+        for char_id in ids:
+            assert db.update_character(char_id, {"current_node": f"n{turn}-{char_id}"})
+    assert saves == []
+
+    db.flush_pending_writes()
+    assert len(saves) == 1
+    for char_id in ids:
+        assert db.get_character(char_id)["current_node"] == f"n2-{char_id}"
+
+
+def test_update_unknown_character_is_rejected(db, monkeypatch):
+    db.create_character({"name": "P", "character_class": "Cientista", "gender": "Mulher"})
+    saves = count_saves(db, monkeypatch)
+    assert db.update_character(999, {"current_node": "x"}) is False
+    db.flush_pending_writes()
+    assert saves == []
+
+
+def create_characters(db, count, **fields):
+    data = {"character_class": "Cientista", "gender": "Mulher"}
+    data.update(fields)
+    return [db.create_character(dict(data, name=f"P{i}")) for i in range(count)]
+
+
+def journal(db):
+    with open(db.NODE_VISITS_LOG, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def record_visits(count):
+    for i in range(count):
+        local_database.record_node_visit(f"node{i % 3}")
+
+
+def test_visit_ids_are_unique_across_processes(db):
+    db.record_node_visit("start")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=record_visits, args=(100,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    # This process must continue after the ids the workers took
+    db.record_node_visit("end")
+    ids = [visit["id"] for visit in journal(db)]
+    assert len(ids) == 402
+    assert len(set(ids)) == 402
+    assert ids[-1] == max(ids)
+
+
+def test_compaction_rolls_up_old_visits(db):
+    char_id = create_characters(db, 1)[0]
+    now = datetime.utcnow()
+    old = now - timedelta(days=db.VISIT_RETENTION_DAYS + 5)
+    db.record_node_visits([{"node_id": "a", "character_id": char_id, "visited_at": old}] * 3
+                          + [{"node_id": "b", "character_id": None, "visited_at": old}])
+    db.record_node_visit("a", char_id)
+
+    assert db.compact_node_visits(now=now) == 4
+    assert [visit["node_id"] for visit in journal(db)] == ["a"]
+    rollups = db.load_visit_rollups()
+    assert rollups["last_id"] == 4
+    assert rollups["node_days"] == {"a": {str(old)[:10]: 3}, "b": {str(old)[:10]: 1}}
+
+    # Totals and per-character history still include the rolled-up visits
+    assert db.count_node_visits() == 5
+    assert db.count_node_visits_for_node("a") == 4
+    assert [char["id"] for char in db.get_characters_that_visited_node("a")] == [char_id]
+    summary = db.get_character_visit_summary(char_id)
+    assert [(entry["node_id"], entry["visit_count"]) for entry in summary] == [("a", 4)]
+
+    # Compacting again within the same window is a no-op, and ids keep growing
+    assert db.compact_node_visits(now=now) == 0
+    assert db.record_node_visit("c") == 6
+
+
+def test_list_characters_pages_without_gaps_or_duplicates(db):
+    ids = create_characters(db, 7)
+    db.update_character(ids[2], {"current_node": "n1"})
+    db.flush_pending_writes()
+    expected = [char["id"] for char in sorted(db.get_all_characters(),
+                                              key=lambda c: (str(c["last_played"]), c["id"]), reverse=True)]
+    assert expected[0] == ids[2]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.list_characters(cursor=cursor, limit=3)
+        seen.extend(char["id"] for char in page)
+        if cursor is None:
+            break
+        if len(seen) == 3:
+            # A character played after the first page doesn't shift the next ones
+            db.create_character({"name": "Late", "character_class": "Cientista", "gender": "Mulher"})
+    assert seen == expected
+
+
+def test_list_characters_filters(db):
+    scientists = create_characters(db, 3)
+    archaeologists = create_characters(db, 20, character_class="Arqueólogo", gender="Homem")
+    page, cursor = db.list_characters(limit=2, **{"class": "Cientista"})
+    rest, last = db.list_characters(cursor=cursor, limit=2, **{"class": "Cientista"})
+    assert [char["id"] for char in page + rest] == scientists[::-1]
+    assert last is None
+    page, _ = db.list_characters(sort="created_at", limit=50, gender="Homem", node="elsewhere")
+    assert page == []
+    page, _ = db.list_characters(sort="created_at", limit=50, gender="Homem")
+    assert [char["id"] for char in page] == archaeologists[::-1]
+    with pytest.raises(ValueError):
+        db.list_characters(sort="name")
@@ -0,0 +1,103 @@
+"""
+Tests for the single-file node store
+"""
+
+import os
+
+import pytest
+
+import node_store
+from node_store import NodeStore, StoryNodes
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "nodes.bin")
+
+
+def node(title, text="", **fields):
+    return dict(fields, title=title, text=text)
+
+
+def test_nodes_round_trip(path):
+    store = NodeStore(path)
+    assert store.write({"start": node("Início", "Era uma vez", choices=[{"next_node": "end"}]),
+                        "end": node("Fim")}) == {"start", "end"}
+    reader = NodeStore(path, use_mmap=True)
+    reader.refresh()
+    assert reader.read_node("start") == node("Início", "Era uma vez", choices=[{"next_node": "end"}])
+    assert reader.meta("end") == {}
+    assert reader.refresh() == set()
+    reader.close()
+
+
+def test_write_reports_nodes_other_workers_changed(path):
+    first, second = NodeStore(path), NodeStore(path)
+    first.write({"a": node("A")})
+    second.refresh()
+    first.write({"b": node("B")})
+    assert second.write({"c": node("C")}) == {"b", "c"}
+    assert set(second.node_ids()) == {"a", "b", "c"}
+
+
+def test_torn_tail_falls_back_to_last_complete_write(path):
+    store = NodeStore(path)
+    store.write({"a": node("A", "first")})
+    store.write({"a": node("A", "second")})
+    intact = os.path.getsize(path)
+    with open(path, "ab") as f:
+        f.write(b"half a write" + node_store.MAGIC + b"\0" * 3)
+
+    reader = NodeStore(path)
+    reader.refresh()
+    assert reader.read_field("a", "text") == "second"
+
+    # The next write replaces the damaged tail
+    reader.write({"b": node("B")})
+    assert os.path.getsize(path) > intact
+    with open(path, "rb") as f:
+        assert node_store._read_index(f)[2] == os.path.getsize(path)
+    assert set(reader.node_ids()) == {"a", "b"}
+
+
+def test_compaction_drops_dead_text(path, monkeypatch):
+    monkeypatch.setattr(node_store, "COMPACT_MIN_BYTES", 4096)
+    store = NodeStore(path)
+    store.write({"keep": node("Keep", "k" * 100)})
+    for i in range(20):
+        store.write({"busy": node("Busy", str(i) * 1000)})
+    # Without compaction the file would hold all twenty versions of "busy"
+    assert os.path.getsize(path) < 5 * 1000
+    assert store.read_field("busy", "text") == "19" * 1000
+    assert store.read_field("keep", "text") == "k" * 100
+
+    store.write({"busy": None})
+    size = os.path.getsize(path)
+    assert store.compact() == set()
+    assert os.path.getsize(path) < size
+    assert list(store.node_ids()) == ["keep"]
+
+
+def test_story_nodes_flush_evicts_changed_nodes(path):
+    store = NodeStore(path)
+    store.write({"a": node("A", "old")})
+    nodes = StoryNodes(store)
+    assert nodes["a"]["text"] == "old"
+
+    other = NodeStore(path)
+    other.write({"a": node("A", "new")})
+    nodes["b"] = node("B")
+    assert nodes.flush() == {"a", "b"}
+    assert nodes["a"]["text"] == "new"
+    assert len(nodes) == 2
+
+
+def test_recovery_finds_trailers_across_blocks(path, monkeypatch):
+    monkeypatch.setattr(node_store, "RECOVERY_BLOCK", 5)
+    store = NodeStore(path)
+    store.write({"a": node("A", "x" * 50)})
+    with open(path, "ab") as f:
+        f.write(b"y" * 23)
+    with open(path, "rb") as f:
+        generation, index, end = node_store._read_index(f)
+    assert (generation, set(index), end) == (1, {"a"}, os.path.getsize(path) - 23)
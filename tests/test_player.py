@@ -0,0 +1,61 @@
+"""
+Tests for Player serialization
+"""
+
+import pytest
+
+from player import PACK_VERSION, Player
+
+
+def seasoned_player():
+    player = Player("Ada", "Cientista", "Mulher")
+    player.modify_attribute("mental", 2)
+    player.change_health(-5)
+    player.add_to_inventory("Lanterna")
+    player.add_to_inventory("Mapa")
+    player.add_special_ability("Visão")
+    player.record_choice("start", 1)
+    player.change_orisha_favor("Ògún", 3)
+    player.add_achievement("Primeiro passo")
+    player.extra = {"id": 7, "notes": ["á", None]}
+    return player
+
+
+def test_dict_round_trip_keeps_every_field():
+    data = seasoned_player().to_dict()
+    assert data["class"] == "Cientista"
+    assert data["id"] == 7
+    assert Player.from_dict(data).to_dict() == data
+
+
+def test_new_player_dict_round_trip():
+    data = Player("Bo", "Arqueólogo", "Homem").to_dict()
+    assert "choices_made" not in data
+    assert Player.from_dict(data).to_dict() == data
+
+
+def test_from_dict_fills_missing_fields_from_class_and_gender():
+    player = Player.from_dict({"name": "Bo", "class": "Arqueólogo", "gender": "Mulher", "current_health": 3})
+    fresh = Player("Bo", "Arqueólogo", "Mulher").to_dict()
+    assert player.to_dict() == dict(fresh, current_health=3)
+
+
+def test_from_dict_does_not_share_lists_with_the_input():
+    data = seasoned_player().to_dict()
+    player = Player.from_dict(data)
+    player.add_to_inventory("Corda")
+    assert "Corda" not in data["inventory"]
+
+
+def test_pack_round_trip():
+    player = seasoned_player()
+    assert Player.unpack(player.pack()).to_dict() == player.to_dict()
+    fresh = Player("Bo", "Arqueólogo", "Homem")
+    assert Player.unpack(fresh.pack()).to_dict() == fresh.to_dict()
+
+
+def test_unpack_rejects_unknown_versions():
+    data = bytearray(Player("Bo", "Arqueólogo", "Homem").pack())
+    data[0] = PACK_VERSION + 1
+    with pytest.raises(ValueError):
+        Player.unpack(bytes(data))
@@ -0,0 +1,109 @@
+"""
+Tests for save slots: snapshots, delta replay, compaction and the manifest
+"""
+
+import os
+
+import pytest
+
+import save_load
+from player import Player
+
+PLAYER_ID = "ab" * 16
+
+
+@pytest.fixture
+def saves(tmp_path, monkeypatch):
+    """save_load writing to an empty save directory"""
+    monkeypatch.setattr(save_load, "SAVE_DIR", str(tmp_path / "saves"))
+    save_load._states.clear()
+    yield save_load
+    save_load._states.clear()
+
+
+def deltas(saves, slot="1"):
+    try:
+        with open(saves.delta_path(PLAYER_ID, slot), encoding="utf-8") as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+
+def play(saves, turns, slot="1"):
+    """Save a player after each of several turns and return the final dict"""
+    player = Player("Ada", "Cientista", "Mulher")
+    for turn in range(turns):
+        player.add_to_inventory(f"item{turn}")
+        player.change_health(-1)
+        player.record_choice(f"node{turn}", turn % 2)
+        assert saves.save_game(player, f"node{turn + 1}", turn + 1, PLAYER_ID, slot)
+    return player.to_dict()
+
+
+def test_later_saves_append_deltas_that_replay_to_the_latest_state(saves):
+    expected = play(saves, 5)
+    assert len(deltas(saves)) == 4
+
+    for cached in (True, False):
+        if not cached:
+            saves._states.clear()
+        loaded = saves.load_game(PLAYER_ID, "1")
+        assert loaded == {"player": expected, "current_node": "node5", "turn_counter": 5}
+
+
+def test_removed_player_fields_stay_removed(saves):
+    data = Player("Ada", "Cientista", "Mulher").to_dict()
+    data["quest"] = "ilê"
+    saves.save_game(data, "start", 1, PLAYER_ID)
+    del data["quest"]
+    saves.save_game(data, "start", 2, PLAYER_ID)
+    saves._states.clear()
+    assert saves.load_game(PLAYER_ID)["player"] == data
+
+
+def test_compaction_folds_deltas_into_the_snapshot(saves):
+    expected = play(saves, 6)
+    assert saves.compact_save(PLAYER_ID, "1") == 5
+    assert deltas(saves) == []
+    saves._states.clear()
+    assert saves.load_game(PLAYER_ID, "1")["player"] == expected
+
+    # Saving after compaction continues the sequence from the snapshot
+    expected = play(saves, 2)
+    saves._states.clear()
+    assert saves.load_game(PLAYER_ID, "1")["player"] == expected
+    assert saves.compact_save(PLAYER_ID, "1") == 2
+
+
+def test_partial_delta_line_is_ignored(saves):
+    play(saves, 3)
+    with open(saves.delta_path(PLAYER_ID, "1"), "a", encoding="utf-8") as f:
+        f.write('{"s":99,"c":')
+    saves._states.clear()
+    assert saves.load_game(PLAYER_ID, "1")["turn_counter"] == 3
+
+    # The next save starts on a fresh line
+    saves.save_game(Player("Ada", "Cientista", "Mulher"), "start", 4, PLAYER_ID, "1")
+    saves._states.clear()
+    assert saves.load_game(PLAYER_ID, "1")["turn_counter"] == 4
+
+
+def test_manifest_lists_slots_and_is_rebuilt_when_lost(saves):
+    play(saves, 2, slot="1")
+    play(saves, 3, slot="2")
+    listed = {save["slot"]: save["turn_counter"] for save in saves.list_saves(PLAYER_ID)}
+    assert listed == {"1": 2, "2": 3}
+
+    os.remove(saves.manifest_path(PLAYER_ID))
+    assert saves.get_save_info(PLAYER_ID, "2")["turn_counter"] == 3
+    assert saves.delete_save(PLAYER_ID, "1")
+    assert [save["slot"] for save in saves.list_saves(PLAYER_ID)] == ["2"]
+    assert saves.load_game(PLAYER_ID, "1") is None
+
+
+def test_invalid_ids_and_slots_are_rejected(saves):
+    with pytest.raises(ValueError):
+        saves.save_path("../etc", "1")
+    with pytest.raises(ValueError):
+        saves.save_path(PLAYER_ID, "../1")
+    assert saves.save_game(Player("Ada", "Cientista", "Mulher"), "start", 1, PLAYER_ID, "a/b") is False
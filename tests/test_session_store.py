@@ -0,0 +1,98 @@
+"""
+Tests for the server-side session stores and session interface
+"""
+
+import time
+
+import pytest
+from flask import Flask, session
+
+import session_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return session_store.MemorySessionStore()
+    return session_store.SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+@pytest.fixture
+def app(store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.session_interface = session_store.ServerSideSessionInterface(store)
+
+    @app.route("/set/<value>")
+    def set_value(value):
+        session["value"] = value
+        return ""
+
+    @app.route("/get")
+    def get_value():
+        return session.get("value", "")
+
+    @app.route("/login")
+    def login():
+        session_store.regenerate(session)
+        session["user"] = "admin"
+        return ""
+
+    return app
+
+
+def session_cookie(client):
+    return client.get_cookie("session").value
+
+
+def test_expired_sessions_are_not_returned(store, monkeypatch):
+    now = time.time()
+    store.set("long", "{}", 60)
+    store.set("short", "{}", 10)
+    monkeypatch.setattr(session_store.time, "time", lambda: now + 30)
+    assert store.get("short") is None
+    assert store.get("long") == "{}"
+    # Writing a session again extends it
+    store.set("long", "{}", 60)
+    monkeypatch.setattr(session_store.time, "time", lambda: now + 75)
+    assert store.get("long") == "{}"
+    monkeypatch.setattr(session_store.time, "time", lambda: now + 91)
+    assert store.get("long") is None
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = session_store.MemorySessionStore(max_entries=2)
+    store.set("a", "1", 60)
+    store.set("b", "2", 60)
+    store.get("a")
+    store.set("c", "3", 60)
+    assert [store.get(sid) for sid in "abc"] == ["1", None, "3"]
+
+
+def test_session_data_lives_on_the_server(app, store):
+    client = app.test_client()
+    client.get("/set/secret")
+    cookie = session_cookie(client)
+    assert "secret" not in cookie
+    assert client.get("/get").get_data(as_text=True) == "secret"
+
+    tampered = ("A" if cookie[0] != "A" else "B") + cookie[1:]
+    client.set_cookie("session", tampered)
+    assert client.get("/get").get_data(as_text=True) == ""
+
+
+def test_regenerate_moves_the_session_to_a_new_id(app, store):
+    client = app.test_client()
+    client.get("/set/kept")
+    before = session_cookie(client)
+    client.get("/login")
+    after = session_cookie(client)
+    assert after != before
+    assert client.get("/get").get_data(as_text=True) == "kept"
+
+    # The old id no longer opens the session
+    old_sid = before.rsplit(".", 1)[0]
+    assert store.get(old_sid) is None
+    attacker = app.test_client()
+    attacker.set_cookie("session", before)
+    assert attacker.get("/get").get_data(as_text=True) == ""
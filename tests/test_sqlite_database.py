@@ -0,0 +1,83 @@
+"""
+Tests for the SQLite storage backend
+"""
+
+import threading
+
+import pytest
+
+import sqlite_database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """sqlite_database working on an empty database file"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sqlite_database, "DATABASE_FILE", str(tmp_path / "rpg.sqlite3"))
+    monkeypatch.setattr(sqlite_database, "_local", threading.local())
+    sqlite_database.ensure_data_dir()
+    yield sqlite_database
+    sqlite_database.get_connection().close()
+
+
+def create_characters(db, count, **fields):
+    data = {"character_class": "Cientista", "gender": "Mulher"}
+    data.update(fields)
+    return [db.create_character(dict(data, name=f"P{i}")) for i in range(count)]
+
+
+def test_list_characters_pages_without_gaps_or_duplicates(db):
+    ids = create_characters(db, 7)
+    db.update_character(ids[2], {"current_node": "n1"})
+    expected = [char["id"] for char in sorted(db.get_all_characters(),
+                                              key=lambda c: (str(c["last_played"]), c["id"]), reverse=True)]
+    assert expected[0] == ids[2]
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.list_characters(cursor=cursor, limit=3)
+        seen.extend(char["id"] for char in page)
+        if cursor is None:
+            break
+        if len(seen) == 3:
+            # A character played after the first page doesn't shift the next ones
+            db.create_character({"name": "Late", "character_class": "Cientista", "gender": "Mulher"})
+    assert seen == expected
+
+
+def test_list_characters_filters(db):
+    scientists = create_characters(db, 3)
+    archaeologists = create_characters(db, 20, character_class="Arqueólogo", gender="Homem")
+    page, cursor = db.list_characters(limit=2, **{"class": "Cientista"})
+    rest, last = db.list_characters(cursor=cursor, limit=2, **{"class": "Cientista"})
+    assert [char["id"] for char in page + rest] == scientists[::-1]
+    assert last is None
+    page, _ = db.list_characters(sort="created_at", limit=50, gender="Homem", node="elsewhere")
+    assert page == []
+    page, _ = db.list_characters(sort="created_at", limit=50, gender="Homem")
+    assert [char["id"] for char in page] == archaeologists[::-1]
+    with pytest.raises(ValueError):
+        db.list_characters(sort="name")
+
+
+def test_fields_without_a_column_round_trip(db):
+    char_id = db.create_character({"name": "Ada", "class": "Cientista", "gender": "Mulher",
+                                   "orisha_favor": {"Ògún": 2}, "title": "Dra."})
+    assert db.update_character(char_id, {"title": None, "quest": "ilê", "current_node": "n2"})
+    character = db.get_character(char_id)
+    assert character["character_class"] == "Cientista"
+    assert character["current_node"] == "n2"
+    assert character["orisha_favor"] == {"Ògún": 2}
+    assert character["title"] is None
+    assert character["quest"] == "ilê"
+    assert "extra" not in character
+    assert db.update_character(999, {"quest": "x"}) is False
+
+
+def test_extra_column_is_added_to_older_databases(db):
+    conn = db.get_connection()
+    with conn:
+        conn.execute('ALTER TABLE "character" DROP COLUMN extra')
+    db.ensure_data_dir()
+    char_id = db.create_character({"name": "Bo", "character_class": "Arqueólogo", "gender": "Homem", "quest": "x"})
+    assert db.get_character(char_id)["quest"] == "x"
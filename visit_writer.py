@@ -0,0 +1,162 @@
+"""
+Visit Writer Module - Records node visits from a background thread
+
+Request handlers only put the visit on a bounded in-process queue; a writer
+thread drains it and stores visits in batches with the backend's
+record_node_visits, when a batch is full or flush_interval has passed.
+If the queue is full the visit is dropped and counted, so a slow disk never
+blocks a player. Pending visits are written when the process exits.
+"""
+
+import os
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+class VisitWriter:
+    def __init__(self, db, max_queue=10000, batch_size=256, flush_interval=0.5, put_timeout=0):
+        """
+        Create a visit writer
+
+        Args:
+            db: Storage backend with record_node_visits
+            max_queue: Visits that can wait in the queue before new ones are dropped
+            batch_size: Most visits written at once
+            flush_interval: Seconds a visit may wait before its batch is written
+            put_timeout: Seconds record() may wait for queue space before dropping
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        atexit.register(self.stop)
+
+    def _ensure_started(self):
+        # Started lazily, and again after a fork, since threads do not survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                if self._pid is not None:
+                    # Forked child: the parent's queue and its locks are not ours
+                    self._queue = queue.Queue(self._queue.maxsize)
+                self._thread = threading.Thread(target=self._run, name="visit-writer", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def record(self, node_id, character_id=None):
+        """
+        Queue a visit
+
+        Returns:
+            bool: False if the queue was full and the visit was dropped
+        """
+        self._ensure_started()
+        visit = {'node_id': node_id, 'character_id': character_id, 'visited_at': datetime.utcnow()}
+        try:
+            if self.put_timeout:
+                self._queue.put(visit, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(visit)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Stopping and everything queued has been written
+                if self._stopping.is_set():
+                    return
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            stop = item is None
+            if not stop:
+                batch.append(item)
+            # Collect more visits until the batch is full or the interval passes
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            self._write(batch)
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.db.record_node_visits(batch)
+            with self._stats_lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            print(f"Erro ao gravar {len(batch)} visitas: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued visit has been written"""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def stop(self, timeout=5):
+        """Write pending visits and stop the writer thread"""
+        if self._pid != os.getpid() or self._stopping.is_set():
+            return
+        self._stopping.set()
+        # The sentinel only speeds things up: with a full queue the thread
+        # drains it and then exits on its own once a get() times out
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        sync = getattr(self.db, 'sync_node_visits', None)
+        if sync is not None:
+            sync()
+
+    def stats(self):
+        """Counters for monitoring"""
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'max_queue': self._queue.maxsize,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'batches': self.batches,
+                'errors': self.errors
+            }